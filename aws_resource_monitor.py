@@ -11,91 +11,137 @@ Sends Slack notifications and uploads reports to Google Drive.
 """
 
 import boto3
+from botocore.config import Config
 import csv
-import json
+import heapq
+import orjson
 import os
+import time
 from datetime import datetime, timedelta, timezone
 from collections import defaultdict
+from statistics import fmean
 import argparse
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
 
+from slack_report import assemble_slack_blocks, build_environment_blocks, send_slack_blocks
+
+# Client configuration shared by every AWS client: a connection pool large enough
+# for the concurrent scans, adaptive retries for throttling, and bounded timeouts
+BOTO_CONFIG = Config(
+    max_pool_connections=100,
+    retries={'mode': 'adaptive', 'max_attempts': 10},
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=30
+)
+
+# Default number of worker threads for per-resource API calls in each environment
+DEFAULT_MAX_WORKERS = 32
+
+# GetMetricData accepts at most 500 queries per request
+METRIC_DATA_BATCH_SIZE = 500
+
+# DescribeLogStreams is limited to 25 transactions per second per account
+LOG_STREAMS_CONCURRENCY = 25
+
+# Number of old log groups (largest first) to include in the results
+TOP_OLD_LOG_GROUPS = 20
+
+
+def create_session(profile, region):
+    """Create a boto3 session, using default credentials if profile is None or empty string."""
+    if profile and profile.strip():
+        return boto3.Session(profile_name=profile, region_name=region)
+    return boto3.Session(region_name=region)
+
+
+# Account IDs already looked up, keyed by profile
+_ACCOUNT_IDS = {}
+
+
+def get_account_id(profile, session):
+    """Get the AWS account ID for a profile using its session, calling STS once per profile."""
+    if profile not in _ACCOUNT_IDS:
+        _ACCOUNT_IDS[profile] = session.client('sts', config=BOTO_CONFIG).get_caller_identity()['Account']
+    return _ACCOUNT_IDS[profile]
+
 
 class AWSResourceMonitor:
-    def __init__(self, profile, environment, region='us-west-2'):
+    def __init__(self, profile, environment, region='us-west-2', max_workers=DEFAULT_MAX_WORKERS):
         """Initialize AWS Resource Monitor."""
         self.environment = environment
         self.profile = profile
         self.region = region
-
-        # Use default credentials if profile is None or empty string
-        if profile and profile.strip():
-            session = boto3.Session(profile_name=profile, region_name=region)
-        else:
-            session = boto3.Session(region_name=region)
-        self.lambda_client = session.client('lambda', region_name=region)
-        self.cloudwatch = session.client('cloudwatch', region_name=region)
-        self.rds_client = session.client('rds', region_name=region)
-        self.iam_client = session.client('iam')
-        self.logs_client = session.client('logs', region_name=region)
-        self.sts_client = session.client('sts')
+        self.max_workers = max_workers
+        self._iam_summary = None
+
+        # One session for every client so credentials are resolved (and refreshed) once;
+        # the pool grows with --max-workers so worker threads never wait on a connection
+        session = create_session(profile, region)
+        config = BOTO_CONFIG.merge(Config(max_pool_connections=max(max_workers, BOTO_CONFIG.max_pool_connections)))
+        self.lambda_client = session.client('lambda', region_name=region, config=config)
+        self.cloudwatch = session.client('cloudwatch', region_name=region, config=config)
+        self.rds_client = session.client('rds', region_name=region, config=config)
+        self.iam_client = session.client('iam', config=config)
+        self.logs_client = session.client('logs', region_name=region, config=config)
 
         # Get account ID
-        self.account_id = self.sts_client.get_caller_identity()['Account']
+        self.account_id = get_account_id(profile, session)
 
         print(f"Initialized monitor for {environment} (Account: {self.account_id}, Region: {region})")
 
-    def scan_lambda_storage(self):
-        """Scan Lambda functions for storage usage."""
-        print(f"\n[{self.environment}] Scanning Lambda functions...")
-
-        functions = []
-        paginator = self.lambda_client.get_paginator('list_functions')
-
-        for page in paginator.paginate():
-            functions.extend(page['Functions'])
+    def scan_lambda_storage(self, exact_storage=False):
+        """Scan Lambda functions for storage usage.
 
-        print(f"  Found {len(functions)} Lambda functions")
+        By default total storage comes from the account settings and versions are
+        only listed far enough to spot bloat; exact_storage sums every version's
+        CodeSize instead.
+        """
+        print(f"\n[{self.environment}] Scanning Lambda functions...")
 
-        total_storage = 0
+        total_storage = None if exact_storage else self._get_total_code_size()
+        # Fall back to summing versions if the account usage is unavailable
+        exact_storage = total_storage is None
+        if exact_storage:
+            total_storage = 0
         unused_count = 0
         version_bloat_count = 0
 
-        for i, function in enumerate(functions, 1):
-            if i % 100 == 0:
-                print(f"  Processed {i}/{len(functions)} functions...")
+        function_names = []
+        paginator = self.lambda_client.get_paginator('list_functions')
 
-            function_name = function['FunctionName']
+        # Each function needs its own version listing; these are independent
+        # network calls, so start them as each page of functions arrives.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for function_name in paginator.paginate().search('Functions[].FunctionName'):
+                function_names.append(function_name)
+                futures.append(executor.submit(self._scan_function_versions, function_name, exact_storage))
 
-            # Get versions
-            versions = []
-            try:
-                version_paginator = self.lambda_client.get_paginator('list_versions_by_function')
-                for page in version_paginator.paginate(FunctionName=function_name):
-                    versions.extend(page['Versions'])
-            except Exception as e:
-                print(f"  Error getting versions for {function_name}: {e}")
+            print(f"  [{self.environment}] Found {len(function_names)} Lambda functions")
 
-            # Calculate storage
-            version_count = len(versions)
-            storage_bytes = sum(v.get('CodeSize', 0) for v in versions)
-            total_storage += storage_bytes
+            for i, future in enumerate(futures, 1):
+                if i % 100 == 0:
+                    print(f"  [{self.environment}] Processed {i}/{len(function_names)} functions...")
 
-            # Get invocation count
-            invocations_30d = self._get_invocation_count(function_name, days=30)
+                storage_bytes, version_count = future.result()
 
-            # Categorize
-            if invocations_30d == 0:
-                unused_count += 1
-            if version_count > 10:
-                version_bloat_count += 1
+                if exact_storage:
+                    total_storage += storage_bytes
+                if version_count > 10:
+                    version_bloat_count += 1
+
+        # Get invocation counts for all functions in batched requests
+        invocations_30d = self._get_invocation_counts(function_names, days=30)
+        unused_count = sum(1 for count in invocations_30d.values() if count == 0)
 
         total_storage_gb = total_storage / (1024 * 1024 * 1024)
         storage_limit_gb = 300
         storage_percent = (total_storage_gb / storage_limit_gb) * 100
 
         return {
-            'total_functions': len(functions),
+            'total_functions': len(function_names),
             'total_storage_gb': round(total_storage_gb, 2),
             'storage_limit_gb': storage_limit_gb,
             'storage_percent': round(storage_percent, 1),
@@ -103,50 +149,108 @@ class AWSResourceMonitor:
             'version_bloat_count': version_bloat_count
         }
 
-    def _get_invocation_count(self, function_name, days=30):
-        """Get invocation count for last N days."""
+    def _get_total_code_size(self):
+        """Return the account's total Lambda code storage in bytes, or None on error."""
         try:
-            end_time = datetime.now(timezone.utc)
-            start_time = end_time - timedelta(days=days)
-
-            response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/Lambda',
-                MetricName='Invocations',
-                Dimensions=[{'Name': 'FunctionName', 'Value': function_name}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=86400 * days,
-                Statistics=['Sum']
-            )
+            return self.lambda_client.get_account_settings()['AccountUsage']['TotalCodeSize']
+        except Exception as e:
+            print(f"  [{self.environment}] Error getting Lambda account settings: {e}")
+            return None
 
-            if response['Datapoints']:
-                return int(response['Datapoints'][0]['Sum'])
-            return 0
-        except:
-            return 0
+    def _scan_function_versions(self, function_name, exact_storage=True):
+        """Return (storage_bytes, version_count) for a Lambda function.
 
-    def scan_iam_roles(self):
-        """Scan IAM roles and check limits."""
-        print(f"\n[{self.environment}] Scanning IAM roles...")
+        Without exact_storage only the first 11 versions are fetched, which is
+        enough to tell whether the function has more than 10.
+        """
+        versions = []
+        pagination_config = {} if exact_storage else {'MaxItems': 11}
+        try:
+            version_paginator = self.lambda_client.get_paginator('list_versions_by_function')
+            for page in version_paginator.paginate(FunctionName=function_name, PaginationConfig=pagination_config):
+                versions.extend(page['Versions'])
+        except Exception as e:
+            print(f"  [{self.environment}] Error getting versions for {function_name}: {e}")
+
+        storage_bytes = sum(v.get('CodeSize', 0) for v in versions)
+        return storage_bytes, len(versions)
+
+    def _get_invocation_counts(self, function_names, days=30):
+        """Get invocation counts for last N days, keyed by function name.
+
+        A single Metrics Insights GROUP BY query would be one request, but Metrics
+        Insights only covers recent data (not a 30-day window) and returns at most
+        500 series, so explicit per-function queries are batched instead. Each query
+        returns daily sums that are totalled here, as CloudWatch may return no
+        datapoints for a single period spanning the whole window.
+        """
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(days=days)
+
+        queries = [
+            {
+                'Id': f'm{i}',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/Lambda',
+                        'MetricName': 'Invocations',
+                        'Dimensions': [{'Name': 'FunctionName', 'Value': function_name}]
+                    },
+                    'Period': 86400,
+                    'Stat': 'Sum'
+                }
+            }
+            for i, function_name in enumerate(function_names)
+        ]
+
+        values = self._get_metric_data(queries, start_time, end_time)
+        return {
+            function_name: int(sum(values.get(f'm{i}', [])))
+            for i, function_name in enumerate(function_names)
+        }
 
-        roles = []
-        paginator = self.iam_client.get_paginator('list_roles')
+    def _get_metric_data(self, queries, start_time, end_time):
+        """Run CloudWatch metric queries in batches, returning values keyed by query Id."""
+        values = defaultdict(list)
 
-        for page in paginator.paginate():
-            roles.extend(page['Roles'])
+        for i in range(0, len(queries), METRIC_DATA_BATCH_SIZE):
+            batch = queries[i:i + METRIC_DATA_BATCH_SIZE]
+            try:
+                paginator = self.cloudwatch.get_paginator('get_metric_data')
+                for page in paginator.paginate(MetricDataQueries=batch, StartTime=start_time, EndTime=end_time):
+                    for result in page['MetricDataResults']:
+                        values[result['Id']].extend(result['Values'])
+            except Exception as e:
+                print(f"  [{self.environment}] Error getting CloudWatch metrics: {e}")
+
+        return values
+
+    def scan_iam_roles(self, with_role_details=False):
+        """Scan IAM roles and check limits.
+
+        The role count comes from the account summary; with_role_details lists
+        every role instead, for an exact count when the summary may be stale.
+        """
+        print(f"\n[{self.environment}] Scanning IAM roles...")
 
         # Get IAM account summary for limits
         try:
-            summary = self.iam_client.get_account_summary()
-            roles_quota = summary['SummaryMap'].get('RolesQuota', 1000)
-            roles_count = summary['SummaryMap'].get('Roles', len(roles))
-        except:
-            roles_quota = 1000
-            roles_count = len(roles)
+            summary = self._get_iam_account_summary()
+        except Exception as e:
+            print(f"  [{self.environment}] Error getting IAM account summary: {e}")
+            summary = {}
+
+        roles_quota = summary.get('RolesQuota', 1000)
+        roles_count = summary.get('Roles')
+
+        # The summary already has the role count; only list roles if it is missing or requested
+        if roles_count is None or with_role_details:
+            paginator = self.iam_client.get_paginator('list_roles')
+            roles_count = sum(1 for _ in paginator.paginate().search('Roles[]'))
 
         roles_percent = (roles_count / roles_quota) * 100
 
-        print(f"  Found {roles_count} IAM roles (Limit: {roles_quota})")
+        print(f"  [{self.environment}] Found {roles_count} IAM roles (Limit: {roles_quota})")
 
         return {
             'total_roles': roles_count,
@@ -154,60 +258,71 @@ class AWSResourceMonitor:
             'roles_percent': round(roles_percent, 1)
         }
 
+    def _get_iam_account_summary(self):
+        """Get the IAM account summary map, fetching it once per monitor."""
+        if self._iam_summary is None:
+            self._iam_summary = self.iam_client.get_account_summary()['SummaryMap']
+        return self._iam_summary
+
     def scan_rds_instances(self):
         """Scan RDS instances for underutilization."""
         print(f"\n[{self.environment}] Scanning RDS instances...")
 
-        instances = []
+        total_instances = 0
+        available = []
         paginator = self.rds_client.get_paginator('describe_db_instances')
 
-        for page in paginator.paginate():
-            instances.extend(page['DBInstances'])
+        # Only available instances report metrics, so keep just the fields needed for those
+        for instance in paginator.paginate().search('DBInstances[]'):
+            total_instances += 1
+            if instance['DBInstanceStatus'] == 'available':
+                available.append((
+                    instance['DBInstanceIdentifier'],
+                    instance.get('Engine', 'unknown'),
+                    instance.get('DBInstanceClass', 'unknown')
+                ))
 
-        print(f"  Found {len(instances)} RDS instances")
+        print(f"  [{self.environment}] Found {total_instances} RDS instances")
 
-        underused_count = 0
-        total_underused = []
+        # Get CPU utilization for all available instances in batched requests
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(days=7)
 
-        for instance in instances:
-            db_id = instance['DBInstanceIdentifier']
-            status = instance['DBInstanceStatus']
+        queries = [
+            {
+                'Id': f'm{i}',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/RDS',
+                        'MetricName': 'CPUUtilization',
+                        'Dimensions': [{'Name': 'DBInstanceIdentifier', 'Value': db_id}]
+                    },
+                    'Period': 86400,
+                    'Stat': 'Average'
+                }
+            }
+            for i, (db_id, _, _) in enumerate(available)
+        ]
+        cpu_values = self._get_metric_data(queries, start_time, end_time)
 
-            if status != 'available':
-                continue
+        # Average each instance's daily datapoints; instances without metrics are skipped
+        avg_cpus = ((instance, fmean(cpu_values[f'm{i}'])) for i, instance in enumerate(available) if cpu_values.get(f'm{i}'))
 
-            # Get CPU utilization
-            try:
-                end_time = datetime.now(timezone.utc)
-                start_time = end_time - timedelta(days=7)
-
-                response = self.cloudwatch.get_metric_statistics(
-                    Namespace='AWS/RDS',
-                    MetricName='CPUUtilization',
-                    Dimensions=[{'Name': 'DBInstanceIdentifier', 'Value': db_id}],
-                    StartTime=start_time,
-                    EndTime=end_time,
-                    Period=86400,
-                    Statistics=['Average']
-                )
-
-                if response['Datapoints']:
-                    avg_cpu = sum(d['Average'] for d in response['Datapoints']) / len(response['Datapoints'])
-
-                    # Consider underused if avg CPU < 10%
-                    if avg_cpu < 10:
-                        underused_count += 1
-                        total_underused.append({
-                            'instance': db_id,
-                            'avg_cpu': round(avg_cpu, 2),
-                            'engine': instance.get('Engine', 'unknown'),
-                            'size': instance.get('DBInstanceClass', 'unknown')
-                        })
-            except Exception as e:
-                print(f"  Error checking {db_id}: {e}")
+        # Consider underused if avg CPU < 10%
+        total_underused = [
+            {
+                'instance': db_id,
+                'avg_cpu': round(avg_cpu, 2),
+                'engine': engine,
+                'size': size
+            }
+            for (db_id, engine, size), avg_cpu in avg_cpus
+            if avg_cpu < 10
+        ]
+        underused_count = len(total_underused)
 
         return {
-            'total_instances': len(instances),
+            'total_instances': total_instances,
             'underused_count': underused_count,
             'underused_details': total_underused
         }
@@ -221,276 +336,169 @@ class AWSResourceMonitor:
         """
         print(f"\n[{self.environment}] Scanning CloudWatch log groups...")
 
-        log_groups = []
         paginator = self.logs_client.get_paginator('describe_log_groups')
-
-        for page in paginator.paginate():
-            log_groups.extend(page['logGroups'])
-
-        print(f"  Found {len(log_groups)} log groups")
-
-        # Warn if there are many log groups
-        if len(log_groups) > 10000:
-            print(f"  WARNING: Large number of log groups detected. Skipping detailed stream checks.")
-            check_streams = False
-
-        old_log_groups = []
+        log_groups = paginator.paginate().search('logGroups[]')
+
+        # Stream checks are only done for small accounts, which needs the total up front
+        last_event_times = {}
+        if check_streams:
+            log_groups = list(log_groups)
+            if len(log_groups) < 1000:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, LOG_STREAMS_CONCURRENCY)) as executor:
+                    last_event_times = dict(zip(
+                        (log_group['logGroupName'] for log_group in log_groups),
+                        executor.map(self._get_last_event_time, log_groups)
+                    ))
+            else:
+                print(f"  [{self.environment}] WARNING: Large number of log groups detected. Skipping detailed stream checks.")
+
+        # Min-heap of (storage_bytes, name, last_event_time) for the largest old log groups
+        largest_old = []
+        old_log_groups_count = 0
+        total_log_groups = 0
         total_storage_bytes = 0
-        threshold_time = datetime.now(timezone.utc) - timedelta(days=days_threshold)
-        threshold_ms = int(threshold_time.timestamp() * 1000)
+        now_ms = int(time.time() * 1000)
+        threshold_ms = now_ms - days_threshold * 86_400_000
 
-        processed = 0
         for log_group in log_groups:
-            processed += 1
-            if processed % 10000 == 0:
-                print(f"  Processed {processed}/{len(log_groups)} log groups...")
+            total_log_groups += 1
+            if total_log_groups % 10000 == 0:
+                print(f"  [{self.environment}] Processed {total_log_groups} log groups...")
 
             log_group_name = log_group['logGroupName']
             storage_bytes = log_group.get('storedBytes', 0)
             total_storage_bytes += storage_bytes
 
-            # Use creation time as baseline
-            last_event_time = log_group.get('creationTime', 0)
-
-            # Only check streams if explicitly requested and count is reasonable
-            if check_streams and len(log_groups) < 1000:
-                try:
-                    streams_response = self.logs_client.describe_log_streams(
-                        logGroupName=log_group_name,
-                        orderBy='LastEventTime',
-                        descending=True,
-                        limit=1
-                    )
-                    if streams_response['logStreams']:
-                        last_event_time = streams_response['logStreams'][0].get('lastEventTimestamp', last_event_time)
-                except:
-                    pass
+            # Use creation time as baseline unless the latest stream event is known
+            last_event_time = last_event_times.get(log_group_name, log_group.get('creationTime', 0))
 
             if last_event_time < threshold_ms:
-                old_log_groups.append({
-                    'name': log_group_name,
-                    'storage_mb': round(storage_bytes / (1024 * 1024), 2),
-                    'last_event_days': round((datetime.now(timezone.utc).timestamp() * 1000 - last_event_time) / (1000 * 86400))
-                })
+                old_log_groups_count += 1
+                entry = (storage_bytes, log_group_name, last_event_time)
+                if len(largest_old) < TOP_OLD_LOG_GROUPS:
+                    heapq.heappush(largest_old, entry)
+                else:
+                    heapq.heappushpop(largest_old, entry)
+
+        old_log_groups = [
+            {
+                'name': log_group_name,
+                'storage_mb': round(storage_bytes / (1024 * 1024), 2),
+                'last_event_days': round((now_ms - last_event_time) / 86_400_000)
+            }
+            for storage_bytes, log_group_name, last_event_time in sorted(largest_old, reverse=True)
+        ]
 
-        print(f"  Scan complete. Identified {len(old_log_groups)} old log groups")
+        print(f"  [{self.environment}] Found {total_log_groups} log groups")
+        print(f"  [{self.environment}] Scan complete. Identified {old_log_groups_count} old log groups")
 
         return {
-            'total_log_groups': len(log_groups),
-            'old_log_groups_count': len(old_log_groups),
+            'total_log_groups': total_log_groups,
+            'old_log_groups_count': old_log_groups_count,
             'total_storage_gb': round(total_storage_bytes / (1024 * 1024 * 1024), 2),
-            'old_log_groups': old_log_groups[:20]  # Top 20 old log groups
-        }
-
-def generate_csv_report(all_results):
-    """Generate CSV report for all environments."""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'aws_resource_report_{timestamp}.csv'
-
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-
-        # Write header
-        writer.writerow(['AWS Resource Usage Report'])
-        writer.writerow(['Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-        writer.writerow([])
-
-        for env, results in all_results.items():
-            writer.writerow([f'=== {env.upper()} ENVIRONMENT ==='])
-            writer.writerow([])
-
-            # Lambda section
-            writer.writerow(['Lambda Storage'])
-            writer.writerow(['Total Functions', results['lambda']['total_functions']])
-            writer.writerow(['Storage Used (GB)', results['lambda']['total_storage_gb']])
-            writer.writerow(['Storage Limit (GB)', results['lambda']['storage_limit_gb']])
-            writer.writerow(['Storage Usage %', results['lambda']['storage_percent']])
-            writer.writerow(['Unused Functions', results['lambda']['unused_count']])
-            writer.writerow(['Functions with Version Bloat (>10 versions)', results['lambda']['version_bloat_count']])
-            writer.writerow([])
-
-            # IAM section
-            writer.writerow(['IAM Roles'])
-            writer.writerow(['Total Roles', results['iam']['total_roles']])
-            writer.writerow(['Roles Quota', results['iam']['roles_quota']])
-            writer.writerow(['Usage %', results['iam']['roles_percent']])
-            writer.writerow([])
-
-            # RDS section
-            writer.writerow(['RDS Instances'])
-            writer.writerow(['Total Instances', results['rds']['total_instances']])
-            writer.writerow(['Underused Instances', results['rds']['underused_count']])
-            if results['rds']['underused_details']:
-                writer.writerow(['Instance Name', 'Avg CPU %', 'Engine', 'Instance Class'])
-                for db in results['rds']['underused_details']:
-                    writer.writerow([db['instance'], db['avg_cpu'], db['engine'], db['size']])
-            writer.writerow([])
-
-            # CloudWatch Logs section
-            writer.writerow(['CloudWatch Log Groups'])
-            writer.writerow(['Total Log Groups', results['logs']['total_log_groups']])
-            writer.writerow(['Old Log Groups (>12 months)', results['logs']['old_log_groups_count']])
-            writer.writerow(['Total Storage (GB)', results['logs']['total_storage_gb']])
-            writer.writerow([])
-            writer.writerow([])
-
-    print(f"\n✓ CSV report generated: {filename}")
-    return filename
-
-
-def send_slack_notification(webhook_url, all_results):
-    """Send formatted Slack notification."""
-
-    # Build the message
-    blocks = [
-        {
-            "type": "header",
-            "text": {
-                "type": "plain_text",
-                "text": "📊 Weekly AWS Resources Usage Alert",
-                "emoji": True
-            }
-        },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"*Report Date:* {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            }
-        },
-        {
-            "type": "divider"
-        },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": "*📋 Definitions & Limits:*\n"
-                        "• *IAM Roles Limit:* Default AWS quota is 1,000 roles per account\n"
-                        "• *Lambda Storage Limit:* 75 GB default (can be increased to 300 GB)\n"
-                        "• *Bloated Lambdas:* Functions with >10 versions consuming extra storage\n"
-                        "• *Underused RDS:* Instances with <10% average CPU over 7 days\n"
-                        "• *Old CloudWatch Logs:* Log groups with no activity for >12 months"
-            }
-        },
-        {
-            "type": "divider"
+            'old_log_groups': old_log_groups  # Top 20 old log groups by storage
         }
-    ]
-
-    for env, results in all_results.items():
-        env_upper = env.upper()
 
-        # Lambda section
-        lambda_emoji = "🔴" if results['lambda']['storage_percent'] > 70 else "🟡" if results['lambda']['storage_percent'] > 50 else "🟢"
-        iam_emoji = "🔴" if results['iam']['roles_percent'] > 80 else "🟡" if results['iam']['roles_percent'] > 60 else "🟢"
-
-        # Calculate percentages
-        rds_underused_percent = round((results['rds']['underused_count'] / results['rds']['total_instances'] * 100), 1) if results['rds']['total_instances'] > 0 else 0
-        logs_old_percent = round((results['logs']['old_log_groups_count'] / results['logs']['total_log_groups'] * 100), 1) if results['logs']['total_log_groups'] > 0 else 0
-        lambda_unused_percent = round((results['lambda']['unused_count'] / results['lambda']['total_functions'] * 100), 1) if results['lambda']['total_functions'] > 0 else 0
-        lambda_bloat_percent = round((results['lambda']['version_bloat_count'] / results['lambda']['total_functions'] * 100), 1) if results['lambda']['total_functions'] > 0 else 0
-
-        blocks.extend([
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*{env_upper} Environment*"
-                }
-            },
-            {
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"{iam_emoji} *IAM Roles in {env_upper}*\n{results['iam']['roles_percent']}% of 100% ({results['iam']['total_roles']}/{results['iam']['roles_quota']})"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"{lambda_emoji} *Lambda Storage in {env_upper}*\n{results['lambda']['storage_percent']}% of 100% ({results['lambda']['total_storage_gb']}/{results['lambda']['storage_limit_gb']} GB)"
-                    }
-                ]
-            },
-            {
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Bloated Lambdas:* {lambda_bloat_percent}% ({results['lambda']['version_bloat_count']}/{results['lambda']['total_functions']})\n*Unused Lambdas:* {lambda_unused_percent}% ({results['lambda']['unused_count']}/{results['lambda']['total_functions']})"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Underused RDS:* {rds_underused_percent}% ({results['rds']['underused_count']}/{results['rds']['total_instances']})"
-                    }
-                ]
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Old CloudWatch Logs:* {logs_old_percent}% ({results['logs']['old_log_groups_count']}/{results['logs']['total_log_groups']} log groups >12 months) | Total Storage: {results['logs']['total_storage_gb']} GB"
-                }
-            },
-            {
-                "type": "divider"
-            }
-        ])
-
-    # Add recommendations section
-    blocks.extend([
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": "*💡 Recommendations:*\n"
-                        "• *Delete unused IAM roles* to stay within quota limits and improve security posture\n"
-                        "• *Clean up old Lambda versions* - keep only 2-3 recent versions to reduce storage bloat\n"
-                        "• *Delete unused CloudWatch log groups* (>12 months old) to reduce storage costs\n"
-                        "• *Review underused RDS instances* - consider downsizing or consolidating\n"
-                        "  └ <https://app.datadoghq.com/dashboard/9ij-isf-e39/overprovisioned-rds?fromUser=false&offset=0&refresh_mode=yearly&from_ts=1767254400000&to_ts=1767628625022&live=true|View Overprovisioned RDS Dashboard>"
-            }
-        },
-        {
-            "type": "divider"
-        },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": "*💰 Understanding AWS Costs:*\n"
-                        "• To understand the cost on AWS resources, please use AWS Cost Explorer\n"
-                        "  └ <https://guild-education.atlassian.net/wiki/spaces/DEVOPS/pages/4582638174/AWS+Cost+Explorer+How+to+Analyze+Cloud+Costs|AWS Cost Explorer Guide>\n"
-                        "• To understand the cost on RDS particularly, refer to this Datadog dashboard\n"
-                        "  └ <https://app.datadoghq.com/cost/analyze/explorer?query=sum%3Aaws.cost.net.amortized.shared.resources.allocated%7Bservicename%3Ards%20AND%20aws_usage_type%3AUSW2-ExtendedSupport%3A%2A%20AND%20aws_cost_type%20IN%20%28Usage%2CDiscountedUsage%2CSavingsPlanCoveredUsage%29%20AND%20NOT%20aws_product%3Asupportenterprise%7D%20by%20%7Bteam%7D.rollup%28sum%2C%20weekly%29&anomaliesOnly=false&displayType=bars&filterRecent=false&measureType=absolute&tableViewType=breakdown&timeframeRefreshMode=paused&start=1756684800000&end=1765497599000&paused=true|RDS Cost Analysis by Team>"
-            }
-        },
-        {
-            "type": "divider"
+    def _get_last_event_time(self, log_group):
+        """Get the most recent event timestamp in a log group, falling back to its creation time."""
+        default = log_group.get('creationTime', 0)
+        try:
+            streams_response = self.logs_client.describe_log_streams(
+                logGroupName=log_group['logGroupName'],
+                orderBy='LastEventTime',
+                descending=True,
+                limit=1
+            )
+            if streams_response['logStreams']:
+                return streams_response['logStreams'][0].get('lastEventTimestamp', default)
+        except:
+            pass
+        return default
+
+def scan_environment(profile, environment, region='us-west-2', max_workers=DEFAULT_MAX_WORKERS, exact_storage=False, with_role_details=False):
+    """Run all resource scans for one environment.
+
+    The scans hit independent AWS services, so they run concurrently and the
+    environment takes as long as its slowest scan.
+    """
+    monitor = AWSResourceMonitor(profile, environment, region, max_workers)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = {
+            'lambda': executor.submit(monitor.scan_lambda_storage, exact_storage),
+            'iam': executor.submit(monitor.scan_iam_roles, with_role_details),
+            'rds': executor.submit(monitor.scan_rds_instances),
+            'logs': executor.submit(monitor.scan_cloudwatch_logs)
         }
-    ])
+        return {name: future.result() for name, future in futures.items()}
 
-    # Add CSV report info
-    csv_report_text = "💾 Detailed CSV report generated"
-    github_run_url = os.environ.get('GITHUB_RUN_URL')
-    if github_run_url:
-        csv_report_text += f" | <{github_run_url}|View artifacts in GitHub Actions>"
 
-    blocks.append({
-        "type": "context",
-        "elements": [
-            {
-                "type": "mrkdwn",
-                "text": csv_report_text
-            }
-        ]
-    })
+def open_csv_report():
+    """Create the CSV report and write its header.
 
-    payload = {
-        "blocks": blocks
-    }
+    Returns (filename, file, writer); environment sections are appended with
+    write_csv_environment() as each scan completes.
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'aws_resource_report_{timestamp}.csv'
 
-    response = requests.post(webhook_url, json=payload)
+    csvfile = open(filename, 'w', newline='')
+    writer = csv.writer(csvfile)
+
+    # Write header
+    writer.writerow(['AWS Resource Usage Report'])
+    writer.writerow(['Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
+    writer.writerow([])
+
+    return filename, csvfile, writer
+
+
+def write_csv_environment(writer, env, results):
+    """Write one environment's section of the CSV report."""
+    writer.writerow([f'=== {env.upper()} ENVIRONMENT ==='])
+    writer.writerow([])
+
+    # Lambda section
+    writer.writerow(['Lambda Storage'])
+    writer.writerow(['Total Functions', results['lambda']['total_functions']])
+    writer.writerow(['Storage Used (GB)', results['lambda']['total_storage_gb']])
+    writer.writerow(['Storage Limit (GB)', results['lambda']['storage_limit_gb']])
+    writer.writerow(['Storage Usage %', results['lambda']['storage_percent']])
+    writer.writerow(['Unused Functions', results['lambda']['unused_count']])
+    writer.writerow(['Functions with Version Bloat (>10 versions)', results['lambda']['version_bloat_count']])
+    writer.writerow([])
+
+    # IAM section
+    writer.writerow(['IAM Roles'])
+    writer.writerow(['Total Roles', results['iam']['total_roles']])
+    writer.writerow(['Roles Quota', results['iam']['roles_quota']])
+    writer.writerow(['Usage %', results['iam']['roles_percent']])
+    writer.writerow([])
+
+    # RDS section
+    writer.writerow(['RDS Instances'])
+    writer.writerow(['Total Instances', results['rds']['total_instances']])
+    writer.writerow(['Underused Instances', results['rds']['underused_count']])
+    if results['rds']['underused_details']:
+        writer.writerow(['Instance Name', 'Avg CPU %', 'Engine', 'Instance Class'])
+        for db in results['rds']['underused_details']:
+            writer.writerow([db['instance'], db['avg_cpu'], db['engine'], db['size']])
+    writer.writerow([])
+
+    # CloudWatch Logs section
+    writer.writerow(['CloudWatch Log Groups'])
+    writer.writerow(['Total Log Groups', results['logs']['total_log_groups']])
+    writer.writerow(['Old Log Groups (>12 months)', results['logs']['old_log_groups_count']])
+    writer.writerow(['Total Storage (GB)', results['logs']['total_storage_gb']])
+    writer.writerow([])
+    writer.writerow([])
+
+
+def send_slack_notification(webhook_url, environment_blocks):
+    """Send formatted Slack notification built from per-environment blocks."""
+    blocks = assemble_slack_blocks(environment_blocks, "💾 Detailed CSV report generated")
+
+    response = send_slack_blocks(webhook_url, blocks)
 
     if response.status_code == 200:
         print("\n✓ Slack notification sent successfully")
@@ -567,8 +575,14 @@ def main():
     parser.add_argument('--region', default='us-west-2', help='AWS region (default: us-west-2)')
     parser.add_argument('--environments', default='dev,stage', help='Comma-separated list of environments to scan: dev, stage, prod, or any combination (default: dev,stage)')
     parser.add_argument('--output-json', help='Save results to JSON file for later consolidation')
+    parser.add_argument('--pretty-json', action='store_true', help='Indent the --output-json file for reading (default: compact)')
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS, help=f'Concurrent AWS API calls per environment (default: {DEFAULT_MAX_WORKERS})')
+    parser.add_argument('--exact-storage', action='store_true', help='Sum CodeSize over every Lambda version instead of using account usage (slower)')
+    parser.add_argument('--with-role-details', action='store_true', help='List every IAM role instead of using the account summary count (slower)')
 
     args = parser.parse_args()
+    if args.max_workers < 1:
+        parser.error('--max-workers must be at least 1')
 
     print("="*80)
     print("AWS Resource Monitor")
@@ -588,51 +602,66 @@ def main():
 
     all_results = {}
 
-    for env_name, profile in environments:
-        print(f"\n{'='*80}")
-        print(f"Scanning {env_name.upper()} environment...")
-        print(f"{'='*80}")
-
-        try:
-            monitor = AWSResourceMonitor(profile, env_name, args.region)
-
-            results = {
-                'lambda': monitor.scan_lambda_storage(),
-                'iam': monitor.scan_iam_roles(),
-                'rds': monitor.scan_rds_instances(),
-                'logs': monitor.scan_cloudwatch_logs()
-            }
+    # Start the CSV report so each environment can be written as it completes
+    csv_filename = None
+    csvfile = None
+    if not args.skip_csv:
+        csv_filename, csvfile, csv_writer = open_csv_report()
 
-            all_results[env_name] = results
+    # Slack blocks are built alongside the CSV section so each result is walked once
+    build_slack = not args.skip_slack and args.slack_webhook
+    slack_environment_blocks = []
 
+    # Environments live in separate accounts, so scan them in parallel
+    with ThreadPoolExecutor(max_workers=max(len(environments), 1)) as executor:
+        futures = {}
+        for env_name, profile in environments:
             print(f"\n{'='*80}")
-            print(f"{env_name.upper()} SUMMARY")
+            print(f"Scanning {env_name.upper()} environment...")
             print(f"{'='*80}")
-            print(f"Lambda Storage: {results['lambda']['total_storage_gb']}/{results['lambda']['storage_limit_gb']} GB ({results['lambda']['storage_percent']}%)")
-            print(f"  - Unused functions: {results['lambda']['unused_count']}")
-            print(f"  - Version bloat: {results['lambda']['version_bloat_count']}")
-            print(f"IAM Roles: {results['iam']['total_roles']}/{results['iam']['roles_quota']} ({results['iam']['roles_percent']}%)")
-            print(f"RDS Instances: {results['rds']['underused_count']} underused / {results['rds']['total_instances']} total")
-            print(f"CloudWatch Logs: {results['logs']['old_log_groups_count']} old log groups / {results['logs']['total_log_groups']} total")
+            futures[env_name] = executor.submit(scan_environment, profile, env_name, args.region, args.max_workers, args.exact_storage, args.with_role_details)
 
-        except Exception as e:
-            print(f"\n✗ Error scanning {env_name}: {e}")
-            import traceback
-            traceback.print_exc()
+        for env_name, future in futures.items():
+            try:
+                results = future.result()
+                all_results[env_name] = results
+
+                if csvfile:
+                    write_csv_environment(csv_writer, env_name, results)
+                if build_slack:
+                    slack_environment_blocks.extend(build_environment_blocks(env_name, results))
+
+                print(f"\n{'='*80}")
+                print(f"{env_name.upper()} SUMMARY")
+                print(f"{'='*80}")
+                print(f"Lambda Storage: {results['lambda']['total_storage_gb']}/{results['lambda']['storage_limit_gb']} GB ({results['lambda']['storage_percent']}%)")
+                print(f"  - Unused functions: {results['lambda']['unused_count']}")
+                print(f"  - Version bloat: {results['lambda']['version_bloat_count']}")
+                print(f"IAM Roles: {results['iam']['total_roles']}/{results['iam']['roles_quota']} ({results['iam']['roles_percent']}%)")
+                print(f"RDS Instances: {results['rds']['underused_count']} underused / {results['rds']['total_instances']} total")
+                print(f"CloudWatch Logs: {results['logs']['old_log_groups_count']} old log groups / {results['logs']['total_log_groups']} total")
+
+            except Exception as e:
+                print(f"\n✗ Error scanning {env_name}: {e}")
+                import traceback
+                traceback.print_exc()
+
+    if csvfile:
+        csvfile.close()
 
     if not all_results:
+        if csv_filename:
+            os.remove(csv_filename)
         print("\n✗ No results to report")
         return
 
-    # Generate CSV report (unless skipped)
-    csv_filename = None
-    if not args.skip_csv:
-        csv_filename = generate_csv_report(all_results)
+    if csv_filename:
+        print(f"\n✓ CSV report generated: {csv_filename}")
 
     # Save results to JSON if requested
     if args.output_json:
-        with open(args.output_json, 'w') as f:
-            json.dump(all_results, f, indent=2, default=str)
+        with open(args.output_json, 'wb') as f:
+            f.write(orjson.dumps(all_results, option=orjson.OPT_INDENT_2 if args.pretty_json else None))
         print(f"\n✓ Results saved to JSON: {args.output_json}")
 
     # Upload to Google Drive (only if CSV was generated)
@@ -647,7 +676,7 @@ def main():
         if not args.slack_webhook:
             print("\n⚠ Warning: --slack-webhook required when not using --skip-slack")
         else:
-            send_slack_notification(args.slack_webhook, all_results)
+            send_slack_notification(args.slack_webhook, slack_environment_blocks)
             print(f"Slack notification sent: {args.slack_webhook[:50]}...")
 
     print(f"\n{'='*80}")
@@ -3,14 +3,13 @@
 Consolidate results from multiple environment scans and send a single Slack notification
 """
 
-import json
-import os
+import orjson
 import sys
 import argparse
-import requests
-from datetime import datetime
 from pathlib import Path
 
+from slack_report import build_slack_blocks, send_slack_blocks
+
 
 def load_results_from_json_files(json_dir):
     """Load all JSON result files from a directory"""
@@ -25,8 +24,8 @@ def load_results_from_json_files(json_dir):
     for json_file in json_files:
         print(f"Loading results from {json_file}")
         try:
-            with open(json_file, 'r') as f:
-                data = json.load(f)
+            with open(json_file, 'rb') as f:
+                data = orjson.loads(f.read())
                 all_results.update(data)
         except Exception as e:
             print(f"Error loading {json_file}: {e}")
@@ -36,136 +35,9 @@ def load_results_from_json_files(json_dir):
 
 def send_consolidated_slack_notification(webhook_url, all_results):
     """Send formatted Slack notification with consolidated results from all environments"""
+    blocks = build_slack_blocks(all_results, "💾 Detailed reports available")
 
-    # Build the message
-    blocks = [
-        {
-            "type": "header",
-            "text": {
-                "type": "plain_text",
-                "text": "📊 Weekly AWS Resources Usage Alert",
-                "emoji": True
-            }
-        },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"*Report Date:* {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            }
-        },
-        {
-            "type": "divider"
-        },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": "*📋 Definitions & Limits:*\n"
-                        "• *IAM Roles Limit:* Default AWS quota is 1,000 roles per account\n"
-                        "• *Lambda Storage Limit:* 75 GB default (can be increased to 300 GB)\n"
-                        "• *Bloated Lambdas:* Functions with >10 versions consuming extra storage\n"
-                        "• *Underused RDS:* Instances with <10% average CPU over 7 days\n"
-                        "• *Old CloudWatch Logs:* Log groups with no activity for >12 months"
-            }
-        },
-        {
-            "type": "divider"
-        }
-    ]
-
-    for env, results in all_results.items():
-        env_upper = env.upper()
-
-        # Lambda section
-        lambda_emoji = "🔴" if results['lambda']['storage_percent'] > 70 else "🟡" if results['lambda']['storage_percent'] > 50 else "🟢"
-        iam_emoji = "🔴" if results['iam']['roles_percent'] > 80 else "🟡" if results['iam']['roles_percent'] > 60 else "🟢"
-
-        blocks.extend([
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*{env_upper} Environment*"
-                }
-            },
-            {
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"{iam_emoji} *IAM Roles in {env_upper}*\n{results['iam']['total_roles']} / {results['iam']['roles_quota']} ({results['iam']['roles_percent']}%)"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"{lambda_emoji} *Lambda Storage in {env_upper}*\n{results['lambda']['total_storage_gb']} / {results['lambda']['storage_limit_gb']} GB ({results['lambda']['storage_percent']}%)"
-                    }
-                ]
-            },
-            {
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Bloated Lambdas:* {results['lambda']['version_bloat_count']}\n*Unused Lambdas:* {results['lambda']['unused_count']}"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Underused RDS:* {results['rds']['underused_count']} / {results['rds']['total_instances']}"
-                    }
-                ]
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Old CloudWatch Logs:* {results['logs']['old_log_groups_count']} log groups (>12 months) | Total: {results['logs']['total_storage_gb']} GB"
-                }
-            },
-            {
-                "type": "divider"
-            }
-        ])
-
-    # Add recommendations section
-    blocks.extend([
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": "*💡 Recommendations:*\n"
-                        "• *Delete unused IAM roles* to stay within quota limits and improve security posture\n"
-                        "• *Clean up old Lambda versions* - keep only 2-3 recent versions to reduce storage bloat\n"
-                        "• *Delete unused CloudWatch log groups* (>12 months old) to reduce storage costs\n"
-                        "• *Review underused RDS instances* - consider downsizing or consolidating"
-            }
-        },
-        {
-            "type": "divider"
-        }
-    ])
-
-    # Add footer
-    github_run_url = os.environ.get('GITHUB_RUN_URL')
-    footer_text = "💾 Detailed reports available"
-    if github_run_url:
-        footer_text += f" | <{github_run_url}|View in GitHub Actions>"
-
-    blocks.append({
-        "type": "context",
-        "elements": [
-            {
-                "type": "mrkdwn",
-                "text": footer_text
-            }
-        ]
-    })
-
-    payload = {
-        "blocks": blocks
-    }
-
-    response = requests.post(webhook_url, json=payload)
+    response = send_slack_blocks(webhook_url, blocks)
 
     if response.status_code == 200:
         print("\n✓ Consolidated Slack notification sent successfully")
@@ -6,28 +6,75 @@ Helps address Lambda 300GB storage limit issues.
 """
 
 import boto3
+from botocore.config import Config
 import csv
 import json
 from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+from collections import Counter, defaultdict
+from operator import itemgetter
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# GetMetricData accepts at most 500 queries per request
+METRIC_DATA_BATCH_SIZE = 500
+
+# Default number of functions analyzed concurrently
+DEFAULT_MAX_WORKERS = 32
+
+# Shared client configuration: enough pooled connections for the worker threads
+# and adaptive retries so throttled calls back off instead of failing
+BOTO_CONFIG = Config(
+    max_pool_connections=64,
+    retries={'mode': 'adaptive', 'max_attempts': 10}
+)
+
+
+# JMESPath projection of the list_functions fields the scan uses
+FUNCTION_FIELDS = 'Functions[].{FunctionName: FunctionName, FunctionArn: FunctionArn, Runtime: Runtime, CodeSize: CodeSize, LastModified: LastModified}'
+
+# Results keep raw sizes; they are only rounded when the CSV is written
+CSV_FORMATTERS = {
+    'total_storage_mb': lambda value: round(value, 2),
+    'latest_version_size_mb': lambda value: round(value, 2)
+}
 
 
 class LambdaStorageScanner:
-    def __init__(self, region='us-west-2', profile=None):
+    # Category rules as (predicate, category), checked in order; anything else is ACTIVE
+    _CATEGORY_RULES = (
+        (lambda versions, storage_mb, invocations: invocations == 0, "UNUSED"),
+        (lambda versions, storage_mb, invocations: versions > 10, "VERSION_BLOAT"),
+        (lambda versions, storage_mb, invocations: storage_mb > 100, "LARGE_STORAGE"),
+        (lambda versions, storage_mb, invocations: invocations < 10, "LOW_USAGE"),
+    )
+
+    # Recommendation templates per category, filled in with str.format
+    _RECOMMENDATIONS = {
+        "UNUSED": "DELETE - No invocations in 30 days. Has {versions} versions consuming storage.",
+        "VERSION_BLOAT": "CLEANUP_VERSIONS - Has {versions} versions. Keep only recent versions.",
+        "LARGE_STORAGE": "OPTIMIZE - Large deployment package. Consider optimization or S3 layers.",
+        "LOW_USAGE": "REVIEW - Only {invocations} invocations in 30 days. Consider deletion.",
+        "ACTIVE": "OK - Actively used with reasonable storage."
+    }
+
+    def __init__(self, region='us-west-2', profile=None, max_workers=DEFAULT_MAX_WORKERS):
         """Initialize Lambda Storage Scanner."""
         session = boto3.Session(profile_name=profile, region_name=region) if profile else boto3.Session(region_name=region)
-        self.lambda_client = session.client('lambda', region_name=region)
-        self.cloudwatch = session.client('cloudwatch', region_name=region)
+        config = BOTO_CONFIG.merge(Config(max_pool_connections=max(max_workers, BOTO_CONFIG.max_pool_connections)))
+        self.lambda_client = session.client('lambda', region_name=region, config=config)
+        self.cloudwatch = session.client('cloudwatch', region_name=region, config=config)
+        self.tagging_client = session.client('resourcegroupstaggingapi', region_name=region, config=config)
         self.region = region
+        self.max_workers = max_workers
 
     def get_all_functions(self):
-        """Get all Lambda functions in the account."""
-        functions = []
-        paginator = self.lambda_client.get_paginator('list_functions')
+        """Get all Lambda functions in the account.
 
-        for page in paginator.paginate():
-            functions.extend(page['Functions'])
+        Only the fields the scan uses are kept from each page; missing fields
+        (e.g. Runtime for container image functions) come back as None.
+        """
+        paginator = self.lambda_client.get_paginator('list_functions')
+        functions = list(paginator.paginate().search(FUNCTION_FIELDS))
 
         print(f"Found {len(functions)} Lambda functions in {self.region}")
         return functions
@@ -45,50 +92,89 @@ class LambdaStorageScanner:
 
         return versions
 
-    def get_function_tags(self, function_arn):
-        """Get tags for a Lambda function."""
+    def get_total_code_size(self):
+        """Get the account's total Lambda code storage (functions and layers) in bytes, or None on error."""
         try:
-            response = self.lambda_client.list_tags(Resource=function_arn)
-            tags = response.get('Tags', {})
-            return {
-                'owner': tags.get('Owner', tags.get('owner', 'N/A')),
-                'contact': tags.get('Contact', tags.get('contact', 'N/A')),
-                'repo': tags.get('Repo', tags.get('repo', tags.get('Repository', 'N/A'))),
-                'environment': tags.get('Environment', tags.get('environment', 'N/A')),
-                'team': tags.get('Team', tags.get('team', 'N/A'))
-            }
+            return self.lambda_client.get_account_settings()['AccountUsage']['TotalCodeSize']
         except Exception as e:
-            print(f"Error getting tags for {function_arn}: {e}")
-            return {
-                'owner': 'N/A',
-                'contact': 'N/A',
-                'repo': 'N/A',
-                'environment': 'N/A',
-                'team': 'N/A'
-            }
+            print(f"Error getting Lambda account settings: {e}")
+            return None
 
-    def get_invocation_count(self, function_name, days=30):
-        """Get invocation count for last N days."""
+    def get_all_function_tags(self):
+        """Get tags for every Lambda function in one paginated call, keyed by function ARN."""
+        tags_by_arn = {}
         try:
-            end_time = datetime.now(timezone.utc)
-            start_time = end_time - timedelta(days=days)
-
-            response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/Lambda',
-                MetricName='Invocations',
-                Dimensions=[{'Name': 'FunctionName', 'Value': function_name}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=86400 * days,  # Total for the period
-                Statistics=['Sum']
+            paginator = self.tagging_client.get_paginator('get_resources')
+            for mapping in paginator.paginate(ResourceTypeFilters=['lambda:function']).search('ResourceTagMappingList[]'):
+                tags_by_arn[mapping['ResourceARN']] = {tag['Key']: tag['Value'] for tag in mapping['Tags']}
+        except Exception as e:
+            print(f"Error getting Lambda function tags: {e}")
+        return tags_by_arn
+
+    def summarize_tags(self, tags):
+        """Pick out the ownership tags, accepting common key spellings."""
+        return {
+            'owner': tags.get('Owner', tags.get('owner', 'N/A')),
+            'contact': tags.get('Contact', tags.get('contact', 'N/A')),
+            'repo': tags.get('Repo', tags.get('repo', tags.get('Repository', 'N/A'))),
+            'environment': tags.get('Environment', tags.get('environment', 'N/A')),
+            'team': tags.get('Team', tags.get('team', 'N/A'))
+        }
+
+    def get_invocation_counts(self, function_names, days=30, recent_days=7):
+        """Get (last N days, last recent_days) invocation counts, keyed by function name.
+
+        Daily sums are fetched with one batched GetMetricData query per function,
+        and both windows are totalled from the same datapoints.
+        """
+        # End at the next UTC midnight so both windows start exactly on a daily bucket's
+        # timestamp; otherwise the oldest bucket of the recent window would be dropped
+        end_time = (datetime.now(timezone.utc) + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        start_time = end_time - timedelta(days=days)
+        recent_start = end_time - timedelta(days=recent_days)
+
+        queries = [
+            {
+                'Id': f'm{i}',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/Lambda',
+                        'MetricName': 'Invocations',
+                        'Dimensions': [{'Name': 'FunctionName', 'Value': function_name}]
+                    },
+                    'Period': 86400,
+                    'Stat': 'Sum'
+                }
+            }
+            for i, function_name in enumerate(function_names)
+        ]
+
+        datapoints = self.get_metric_data(queries, start_time, end_time)
+
+        counts = {}
+        for i, function_name in enumerate(function_names):
+            points = datapoints.get(f'm{i}', [])
+            counts[function_name] = (
+                int(sum(value for _, value in points)),
+                int(sum(value for timestamp, value in points if timestamp >= recent_start))
             )
+        return counts
 
-            if response['Datapoints']:
-                return int(response['Datapoints'][0]['Sum'])
-            return 0
-        except Exception as e:
-            print(f"Error getting invocations for {function_name}: {e}")
-            return 0
+    def get_metric_data(self, queries, start_time, end_time):
+        """Run CloudWatch metric queries in batches, returning (timestamp, value) pairs keyed by query Id."""
+        datapoints = defaultdict(list)
+        paginator = self.cloudwatch.get_paginator('get_metric_data')
+
+        for i in range(0, len(queries), METRIC_DATA_BATCH_SIZE):
+            batch = queries[i:i + METRIC_DATA_BATCH_SIZE]
+            try:
+                for page in paginator.paginate(MetricDataQueries=batch, StartTime=start_time, EndTime=end_time):
+                    for result in page['MetricDataResults']:
+                        datapoints[result['Id']].extend(zip(result['Timestamps'], result['Values']))
+            except Exception as e:
+                print(f"Error getting CloudWatch metrics: {e}")
+
+        return datapoints
 
     def calculate_storage_usage(self, function_name, versions):
         """Calculate total storage usage for a function and all its versions."""
@@ -100,10 +186,9 @@ class LambdaStorageScanner:
 
         return total_storage
 
-    def analyze_function(self, function):
-        """Analyze a single Lambda function."""
+    def analyze_function(self, function, invocations_30d=0, invocations_7d=0, tags=None):
+        """Analyze a single Lambda function using its pre-fetched invocation counts and tags."""
         function_name = function['FunctionName']
-        function_arn = function['FunctionArn']
 
         print(f"Analyzing: {function_name}...")
 
@@ -115,28 +200,22 @@ class LambdaStorageScanner:
         total_storage_bytes = self.calculate_storage_usage(function_name, versions)
         total_storage_mb = total_storage_bytes / (1024 * 1024)
 
-        # Get invocation count
-        invocations_30d = self.get_invocation_count(function_name, days=30)
-        invocations_7d = self.get_invocation_count(function_name, days=7)
-
-        # Get tags
-        tags = self.get_function_tags(function_arn)
+        tags = self.summarize_tags(tags or {})
 
         # Categorize function
         category = self.categorize_function(version_count, total_storage_mb, invocations_30d)
 
         # Get latest version info
-        latest_version = function
-        runtime = latest_version.get('Runtime', 'N/A')
-        last_modified = latest_version.get('LastModified', 'N/A')
-        code_size_mb = latest_version.get('CodeSize', 0) / (1024 * 1024)
+        runtime = function['Runtime'] or 'N/A'
+        last_modified = function['LastModified'] or 'N/A'
+        code_size_mb = (function['CodeSize'] or 0) / (1024 * 1024)
 
         return {
             'function_name': function_name,
             'runtime': runtime,
             'version_count': version_count,
-            'latest_version_size_mb': round(code_size_mb, 2),
-            'total_storage_mb': round(total_storage_mb, 2),
+            'latest_version_size_mb': code_size_mb,
+            'total_storage_mb': total_storage_mb,
             'invocations_30d': invocations_30d,
             'invocations_7d': invocations_7d,
             'last_modified': last_modified,
@@ -152,58 +231,58 @@ class LambdaStorageScanner:
 
     def categorize_function(self, version_count, storage_mb, invocations):
         """Categorize function based on usage and storage."""
-        if invocations == 0:
-            return "UNUSED"
-        elif version_count > 10:
-            return "VERSION_BLOAT"
-        elif storage_mb > 100:
-            return "LARGE_STORAGE"
-        elif invocations < 10:
-            return "LOW_USAGE"
-        else:
-            return "ACTIVE"
+        for matches, category in self._CATEGORY_RULES:
+            if matches(version_count, storage_mb, invocations):
+                return category
+        return "ACTIVE"
 
     def get_recommendation(self, category, version_count, invocations):
         """Get recommendation based on category."""
-        recommendations = {
-            "UNUSED": f"DELETE - No invocations in 30 days. Has {version_count} versions consuming storage.",
-            "VERSION_BLOAT": f"CLEANUP_VERSIONS - Has {version_count} versions. Keep only recent versions.",
-            "LARGE_STORAGE": f"OPTIMIZE - Large deployment package. Consider optimization or S3 layers.",
-            "LOW_USAGE": f"REVIEW - Only {invocations} invocations in 30 days. Consider deletion.",
-            "ACTIVE": "OK - Actively used with reasonable storage."
-        }
-        return recommendations.get(category, "REVIEW")
+        return self._RECOMMENDATIONS.get(category, "REVIEW").format(versions=version_count, invocations=invocations)
 
     def scan_all_functions(self):
         """Scan all Lambda functions and return analysis."""
         functions = self.get_all_functions()
-        results = []
 
-        total_storage = 0
+        # Get invocation counts and tags for all functions in batched requests
+        invocations = self.get_invocation_counts([f['FunctionName'] for f in functions], days=30, recent_days=7)
+        tags_by_arn = self.get_all_function_tags()
+
+        # Version lookups are independent per function, so run them concurrently
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(
+                lambda function: self.analyze_function(
+                    function, *invocations[function['FunctionName']], tags=tags_by_arn.get(function['FunctionArn'])
+                ),
+                functions
+            ))
 
-        for function in functions:
-            result = self.analyze_function(function)
-            results.append(result)
-            total_storage += result['total_storage_mb']
+        storage_mb = itemgetter('total_storage_mb')
+        total_storage = sum(map(storage_mb, results))
 
         # Sort by total storage (highest first)
-        results.sort(key=lambda x: x['total_storage_mb'], reverse=True)
+        results.sort(key=storage_mb, reverse=True)
 
         print(f"\n{'='*80}")
         print(f"SCAN COMPLETE")
         print(f"{'='*80}")
         print(f"Total Functions: {len(results)}")
         print(f"Total Storage: {total_storage:,.2f} MB ({total_storage/1024:.2f} GB)")
+
+        # The storage quota is measured against account usage, which also counts layers
+        account_storage_bytes = self.get_total_code_size()
+        if account_storage_bytes is not None:
+            account_storage = account_storage_bytes / (1024 * 1024)
+            print(f"Account Code Storage: {account_storage:,.2f} MB ({account_storage/1024:.2f} GB)")
+        else:
+            account_storage = total_storage
+
         print(f"Storage Limit: 300 GB")
-        print(f"Storage Used: {(total_storage/1024/300)*100:.1f}%")
+        print(f"Storage Used: {(account_storage/1024/300)*100:.1f}%")
 
         # Category breakdown
-        categories = defaultdict(int)
-        for result in results:
-            categories[result['category']] += 1
-
         print(f"\nCategory Breakdown:")
-        for category, count in sorted(categories.items(), key=lambda x: x[1], reverse=True):
+        for category, count in Counter(map(itemgetter('category'), results)).most_common():
             print(f"  {category}: {count}")
 
         return results, total_storage
@@ -233,10 +312,16 @@ class LambdaStorageScanner:
             'region'
         ]
 
-        with open(filename, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(results)
+        formatters = [CSV_FORMATTERS.get(field) for field in fieldnames]
+
+        # Project each result to a row tuple directly rather than going through DictWriter
+        with open(filename, 'w', newline='', buffering=1 << 20) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(fieldnames)
+            writer.writerows(
+                [format_value(result[field]) if format_value else result[field] for field, format_value in zip(fieldnames, formatters)]
+                for result in results
+            )
 
         print(f"\n✓ Results exported to: {filename}")
         return filename
@@ -276,8 +361,11 @@ def main():
     parser.add_argument('--region', default='us-west-2', help='AWS region (default: us-west-2)')
     parser.add_argument('--profile', help='AWS profile to use')
     parser.add_argument('--output', help='Output CSV filename')
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS, help=f'Functions analyzed concurrently (default: {DEFAULT_MAX_WORKERS})')
 
     args = parser.parse_args()
+    if args.max_workers < 1:
+        parser.error('--max-workers must be at least 1')
 
     print(f"{'='*80}")
     print(f"Lambda Storage Scanner")
@@ -287,7 +375,7 @@ def main():
         print(f"Profile: {args.profile}")
     print(f"{'='*80}\n")
 
-    scanner = LambdaStorageScanner(region=args.region, profile=args.profile)
+    scanner = LambdaStorageScanner(region=args.region, profile=args.profile, max_workers=args.max_workers)
 
     # Scan all functions
     results, total_storage = scanner.scan_all_functions()
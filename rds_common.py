@@ -0,0 +1,123 @@
+"""
+Shared RDS instance listing and environment scanning for rds_extended_support_check.py and rds_version_scan.py
+Both scripts read the same DescribeDBInstances fields and apply their own checks
+"""
+
+import boto3
+from botocore.config import Config
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from io import StringIO
+
+# Client configuration for every AWS client: adaptive retries so throttled calls
+# back off instead of failing, and bounded timeouts. A client is shared by at most
+# a few threads, so the default connection pool is enough
+BOTO_CONFIG = Config(
+    retries={'mode': 'adaptive', 'max_attempts': 10},
+    connect_timeout=5,
+    read_timeout=30
+)
+
+# Region scanned when --regions isn't given
+DEFAULT_REGION = 'us-west-2'
+
+# JMESPath projection of the DescribeDBInstances fields the scans use (also what --cache-dir stores)
+DB_INSTANCE_FIELDS = 'DBInstances[].{DBInstanceIdentifier: DBInstanceIdentifier, Engine: Engine, EngineVersion: EngineVersion, DBInstanceClass: DBInstanceClass, DBInstanceStatus: DBInstanceStatus}'
+
+
+def parse_regions(regions):
+    """Split a comma-separated region list, dropping blanks and duplicates"""
+    return list(dict.fromkeys(region.strip() for region in regions.split(',') if region.strip()))
+
+
+# Creating clients is not thread-safe (using them is), so it is serialized
+_CLIENT_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_session(profile_name):
+    """Get the session for a profile, created once so its loaded service models are reused"""
+    return boto3.Session(profile_name=profile_name)
+
+
+@lru_cache(maxsize=None)
+def get_client(profile_name, service, region=None):
+    """Get a client for a profile and region, created once and reused across scans"""
+    with _CLIENT_LOCK:
+        return get_session(profile_name).client(service, region_name=region, config=BOTO_CONFIG)
+
+
+def list_db_instances(rds_client, caller_identity, cache_dir=None, out=sys.stdout):
+    """List the account's DB instances in the client's region, reusing today's copy from cache_dir when one is set"""
+    paginator = rds_client.get_paginator('describe_db_instances')
+    if not cache_dir:
+        return list(paginator.paginate().search(DB_INSTANCE_FIELDS))
+
+    # Keyed by account, region and day, so repeated runs on the same day skip the AWS calls
+    account_id = caller_identity.result()['Account']
+    cache_file = os.path.join(cache_dir, f"{account_id}-{rds_client.meta.region_name}-{datetime.now():%Y%m%d}.pkl")
+    if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            instances = pickle.load(f)
+        print(f"Loaded {len(instances)} instances from cache: {cache_file}", file=out)
+        return instances
+
+    instances = list(paginator.paginate().search(DB_INSTANCE_FIELDS))
+
+    # Write to a temporary file and rename it so an interrupted run never leaves a partial cache
+    os.makedirs(cache_dir, exist_ok=True)
+    f = tempfile.NamedTemporaryFile('wb', dir=cache_dir, suffix='.tmp', delete=False)
+    try:
+        with f:
+            pickle.dump(instances, f)
+        os.replace(f.name, cache_file)
+    except Exception:
+        # Don't leave the temporary file behind if the write or rename fails
+        os.unlink(f.name)
+        raise
+    return instances
+
+
+def fetch_all_instances(profile_name, regions=(DEFAULT_REGION,), cache_dir=None, out=sys.stdout):
+    """Return the account ID and the DB instances in every region for a profile"""
+    sts = get_client(profile_name, 'sts')
+    rds_clients = [get_client(profile_name, 'rds', region) for region in regions]
+
+    # Look up the account ID and list each region's instances concurrently
+    with ThreadPoolExecutor(max_workers=len(rds_clients) + 1) as executor:
+        caller_identity = executor.submit(sts.get_caller_identity)
+        region_instances = list(executor.map(
+            lambda rds_client: list_db_instances(rds_client, caller_identity, cache_dir, out),
+            rds_clients
+        ))
+
+    return caller_identity.result()['Account'], [instance for instances in region_instances for instance in instances]
+
+
+def scan_environments(environments, scan, max_workers, *scan_args):
+    """Run scan(profile, env_name, out, *scan_args) for each (env_name, profile) and yield (env_name, result)
+
+    Environments live in separate accounts, so they are scanned in parallel; each report
+    is buffered and printed in environment order once its scan finishes
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for env_name, profile in environments:
+            output = StringIO()
+            futures[env_name] = (output, executor.submit(scan, profile, env_name, output, *scan_args))
+
+        for env_name, (output, future) in futures.items():
+            # Wait for the scan, then print its report ahead of any error
+            error = future.exception()
+            print(output.getvalue(), end='')
+            if error:
+                print(f"\n✗ Error scanning {env_name.upper()}: {error}")
+                continue
+
+            yield env_name, future.result()
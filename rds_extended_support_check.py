@@ -10,11 +10,15 @@ Current Extended Support Versions:
 - PostgreSQL 13: Actively in Extended Support
 """
 
-import boto3
 import argparse
 import csv
-from datetime import datetime, timedelta
+import re
+import sys
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from functools import lru_cache
+
+from rds_common import DEFAULT_REGION, fetch_all_instances, parse_regions, scan_environments
 
 # Extended support cutoff dates for common database engines
 # Versions older than these dates are typically in extended support
@@ -50,92 +54,67 @@ UPCOMING_EXTENDED_SUPPORT = {
     }
 }
 
+# Support end dates from both tables, parsed once instead of per instance
+SUPPORT_END_DATES = {
+    date_str: datetime.strptime(date_str, '%Y-%m-%d').date()
+    for table in (EXTENDED_SUPPORT_VERSIONS, UPCOMING_EXTENDED_SUPPORT)
+    for versions in table.values()
+    for date_str in versions.values()
+}
+
+# Engine name -> engine key in the support tables (Aurora PostgreSQL follows PostgreSQL versions)
+ENGINE_BASE = {
+    'postgres': 'postgres',
+    'aurora-postgresql': 'postgres',
+    'mysql': 'mysql',
+    'mariadb': 'mariadb',
+}
+
+# Builds the major version the support tables are keyed by from the split version string
+MAJOR_VERSION_FORMATS = {
+    'postgres': lambda parts: parts[0],  # 12.22 -> 12
+    'mysql': lambda parts: f"{parts[0]}.{parts[1]}",  # 5.7.44 -> 5.7
+    'mariadb': lambda parts: f"{parts[0]}.{parts[1]}",  # 10.5.22 -> 10.5
+}
+
 # RDS Extended Support Pricing (per vCPU-hour in us-west-2)
 # Year 1: ~$0.10/vCPU-hour, Year 2+: ~$0.20/vCPU-hour
 EXTENDED_SUPPORT_COST_YEAR1_PER_VCPU_HOUR = 0.10
 EXTENDED_SUPPORT_COST_YEAR2_PER_VCPU_HOUR = 0.20
 
-# Instance class to vCPU mapping for common RDS instance types
-INSTANCE_VCPU_MAP = {
-    # T3 instances
-    'db.t3.micro': 2,
-    'db.t3.small': 2,
-    'db.t3.medium': 2,
-    'db.t3.large': 2,
-    'db.t3.xlarge': 4,
-    'db.t3.2xlarge': 8,
-    # T4g instances (Graviton2)
-    'db.t4g.micro': 2,
-    'db.t4g.small': 2,
-    'db.t4g.medium': 2,
-    'db.t4g.large': 2,
-    'db.t4g.xlarge': 4,
-    'db.t4g.2xlarge': 8,
-    # M5 instances
-    'db.m5.large': 2,
-    'db.m5.xlarge': 4,
-    'db.m5.2xlarge': 8,
-    'db.m5.4xlarge': 16,
-    'db.m5.8xlarge': 32,
-    'db.m5.12xlarge': 48,
-    'db.m5.16xlarge': 64,
-    'db.m5.24xlarge': 96,
-    # M6g instances (Graviton2)
-    'db.m6g.large': 2,
-    'db.m6g.xlarge': 4,
-    'db.m6g.2xlarge': 8,
-    'db.m6g.4xlarge': 16,
-    'db.m6g.8xlarge': 32,
-    'db.m6g.12xlarge': 48,
-    'db.m6g.16xlarge': 64,
-    # R4 instances
-    'db.r4.large': 2,
-    'db.r4.xlarge': 4,
-    'db.r4.2xlarge': 8,
-    'db.r4.4xlarge': 16,
-    'db.r4.8xlarge': 32,
-    'db.r4.16xlarge': 64,
-    # R5 instances
-    'db.r5.large': 2,
-    'db.r5.xlarge': 4,
-    'db.r5.2xlarge': 8,
-    'db.r5.4xlarge': 16,
-    'db.r5.8xlarge': 32,
-    'db.r5.12xlarge': 48,
-    'db.r5.16xlarge': 64,
-    'db.r5.24xlarge': 96,
-    # R7g instances (Graviton3)
-    'db.r7g.large': 2,
-    'db.r7g.xlarge': 4,
-    'db.r7g.2xlarge': 8,
-    'db.r7g.4xlarge': 16,
-    'db.r7g.8xlarge': 32,
-    'db.r7g.12xlarge': 48,
-    'db.r7g.16xlarge': 64,
+# vCPUs per instance size for the sizes below xlarge (and xlarge itself); larger
+# sizes follow the Nxlarge -> N * 4 vCPUs rule, e.g. db.r5.4xlarge has 16 vCPUs
+INSTANCE_SIZE_VCPUS = {
+    'micro': 2,
+    'small': 2,
+    'medium': 2,
+    'large': 2,
+    'xlarge': 4,
+}
+XLARGE_SIZE = re.compile(r'(\d+)xlarge')
+
+# Classes whose vCPUs can't be read from the size
+INSTANCE_CLASS_VCPUS = {
     # Serverless - estimated average at 2 ACUs (1 ACU = 2 GB RAM, ~0.5 vCPU equivalent)
     'db.serverless': 1,  # Conservative estimate for serverless
 }
 
-def check_extended_support(engine, version):
-    """Check if a given engine version is likely in extended support"""
-    engine_base = engine.split('-')[0]  # Handle oracle-ee, oracle-se2, etc.
-
-    # Map aurora to postgres for version checking
-    if engine == 'aurora-postgresql':
-        engine_base = 'postgres'
+# Fleets share a handful of (engine, version) pairs, so the lookups below are cached
+@lru_cache(maxsize=None)
+def get_support_version(engine, version):
+    """Return the (base engine, major version) keys used by the support tables, or (None, None) for other engines"""
+    engine_base = ENGINE_BASE.get(engine)
+    if engine_base is None:
+        return None, None
 
-    if engine_base not in EXTENDED_SUPPORT_VERSIONS:
-        return False, "Unknown"
+    # Only the leading components matter, so stop splitting after the second '.'
+    return engine_base, MAJOR_VERSION_FORMATS[engine_base](version.split('.', 2))
 
-    # Extract major version
-    version_parts = version.split('.')
-    if engine_base == 'postgres':
-        major_version = version_parts[0]
-    elif engine_base in ['mysql', 'mariadb']:
-        major_version = f"{version_parts[0]}.{version_parts[1]}"
-    elif engine_base == 'oracle':
-        major_version = version_parts[0]
-    else:
+@lru_cache(maxsize=None)
+def check_extended_support(engine, version):
+    """Check if a given engine version is likely in extended support"""
+    engine_base, major_version = get_support_version(engine, version)
+    if engine_base is None:
         return False, "Unknown"
 
     if major_version in EXTENDED_SUPPORT_VERSIONS[engine_base]:
@@ -143,32 +122,16 @@ def check_extended_support(engine, version):
 
     return False, "Standard Support"
 
-def check_upcoming_extended_support(engine, version):
-    """Check if a given engine version will enter extended support within 30 days"""
-    engine_base = engine.split('-')[0]  # Handle oracle-ee, oracle-se2, etc.
-
-    # Map aurora to postgres for version checking
-    if engine == 'aurora-postgresql':
-        engine_base = 'postgres'
-
-    if engine_base not in UPCOMING_EXTENDED_SUPPORT:
-        return False, None
-
-    # Extract major version
-    version_parts = version.split('.')
-    if engine_base == 'postgres':
-        major_version = version_parts[0]
-    elif engine_base in ['mysql', 'mariadb']:
-        major_version = f"{version_parts[0]}.{version_parts[1]}"
-    elif engine_base == 'oracle':
-        major_version = version_parts[0]
-    else:
+@lru_cache(maxsize=None)
+def check_upcoming_extended_support(engine, version, today):
+    """Check if a given engine version will enter extended support within 30 days of today"""
+    engine_base, major_version = get_support_version(engine, version)
+    if engine_base is None:
         return False, None
 
     if major_version in UPCOMING_EXTENDED_SUPPORT[engine_base]:
         support_end_date_str = UPCOMING_EXTENDED_SUPPORT[engine_base][major_version]
-        support_end_date = datetime.strptime(support_end_date_str, '%Y-%m-%d')
-        today = datetime.now()
+        support_end_date = SUPPORT_END_DATES[support_end_date_str]
         days_until_end = (support_end_date - today).days
 
         # Check if support ends within 30 days
@@ -177,19 +140,30 @@ def check_upcoming_extended_support(engine, version):
 
     return False, None
 
-def calculate_extended_support_cost(instance_class, support_end_date_str):
-    """Calculate estimated monthly extended support cost"""
+@lru_cache(maxsize=None)
+def get_vcpu_count(instance_class):
+    """Get the vCPU count for an instance class from its size, defaulting to 2 if unknown"""
+    if instance_class in INSTANCE_CLASS_VCPUS:
+        return INSTANCE_CLASS_VCPUS[instance_class]
+
+    size = instance_class.rsplit('.', 1)[-1]
+    if size in INSTANCE_SIZE_VCPUS:
+        return INSTANCE_SIZE_VCPUS[size]
+
+    match = XLARGE_SIZE.fullmatch(size)
+    return int(match.group(1)) * 4 if match else 2
+
+def calculate_extended_support_cost(instance_class, support_end_date_str, today):
+    """Calculate estimated monthly extended support cost as of today"""
     # Get vCPU count
-    vcpu_count = INSTANCE_VCPU_MAP.get(instance_class, 2)  # Default to 2 if unknown
+    vcpu_count = get_vcpu_count(instance_class)
 
-    # Parse support end date
-    try:
-        support_end_date = datetime.strptime(support_end_date_str, '%Y-%m-%d')
-    except:
+    # Look up the pre-parsed support end date
+    support_end_date = SUPPORT_END_DATES.get(support_end_date_str)
+    if support_end_date is None:
         return 0.0, 0, "Unknown"
 
     # Calculate which year of extended support we're in
-    today = datetime.now()
     days_in_extended_support = (today - support_end_date).days
     years_in_extended_support = days_in_extended_support / 365.25
 
@@ -207,108 +181,115 @@ def calculate_extended_support_cost(instance_class, support_end_date_str):
 
     return monthly_cost, vcpu_count, support_year
 
-def scan_rds_instances(profile_name, environment_name):
-    """Scan RDS instances in an environment"""
-    session = boto3.Session(profile_name=profile_name)
-    rds_client = session.client('rds', region_name='us-west-2')
+def scan_rds_instances(profile_name, environment_name, out=sys.stdout, cache_dir=None, regions=(DEFAULT_REGION,), today=None):
+    """Scan RDS instances in an environment as of today (default: the current date), writing its report to out"""
+    print(f"\n{'='*80}", file=out)
+    print(f"Scanning {environment_name.upper()} environment (Profile: {profile_name})", file=out)
+    print(f"{'='*80}", file=out)
 
-    print(f"\n{'='*80}")
-    print(f"Scanning {environment_name.upper()} environment (Profile: {profile_name})")
-    print(f"{'='*80}")
-
-    # Get account ID
-    sts = session.client('sts')
-    account_id = sts.get_caller_identity()['Account']
-    print(f"Account ID: {account_id}")
+    account_id, instances = fetch_all_instances(profile_name, regions, cache_dir, out)
+    print(f"Account ID: {account_id}", file=out)
+    if len(regions) > 1:
+        print(f"Regions: {', '.join(regions)}", file=out)
 
     extended_support_instances = []
     upcoming_extended_instances = []
-    all_instances = []
-
-    # Paginate through all RDS instances
-    paginator = rds_client.get_paginator('describe_db_instances')
-
-    for page in paginator.paginate():
-        for instance in page['DBInstances']:
-            db_id = instance['DBInstanceIdentifier']
-            engine = instance['Engine']
-            version = instance['EngineVersion']
-            instance_class = instance['DBInstanceClass']
-            status = instance['DBInstanceStatus']
-
-            is_extended, support_date = check_extended_support(engine, version)
-            is_upcoming, upcoming_date = check_upcoming_extended_support(engine, version)
-
-            # Calculate extended support cost if applicable
-            monthly_cost = 0.0
-            vcpu_count = 0
-            support_year = "N/A"
-
-            if is_extended and support_date != "Unknown":
-                monthly_cost, vcpu_count, support_year = calculate_extended_support_cost(instance_class, support_date)
-
-            instance_info = {
-                'identifier': db_id,
-                'engine': engine,
-                'version': version,
-                'class': instance_class,
-                'status': status,
-                'extended_support': is_extended,
-                'support_date': support_date,
-                'upcoming_extended': is_upcoming,
-                'upcoming_date': upcoming_date,
-                'monthly_cost': monthly_cost,
-                'vcpu_count': vcpu_count,
-                'support_year': support_year
-            }
-
-            all_instances.append(instance_info)
-
-            if is_extended:
-                extended_support_instances.append(instance_info)
-            elif is_upcoming:
-                upcoming_extended_instances.append(instance_info)
+
+    # One reference date for the whole scan, shared by the support checks and cost
+    # estimates, keeps the cached upcoming checks reusable
+    today = today or date.today()
+
+    for instance in instances:
+        engine = instance['Engine']
+        version = instance['EngineVersion']
+
+        is_extended, support_date = check_extended_support(engine, version)
+        is_upcoming, upcoming_date = check_upcoming_extended_support(engine, version, today)
+
+        # Only instances that are reported on are kept
+        if not (is_extended or is_upcoming):
+            continue
+
+        db_id = instance['DBInstanceIdentifier']
+        instance_class = instance['DBInstanceClass']
+        status = instance['DBInstanceStatus']
+
+        # Calculate extended support cost if applicable
+        monthly_cost = 0.0
+        vcpu_count = 0
+        support_year = "N/A"
+
+        if is_extended and support_date != "Unknown":
+            monthly_cost, vcpu_count, support_year = calculate_extended_support_cost(instance_class, support_date, today)
+
+        instance_info = {
+            'identifier': db_id,
+            'engine': engine,
+            'version': version,
+            'class': instance_class,
+            'status': status,
+            'extended_support': is_extended,
+            'support_date': support_date,
+            'upcoming_extended': is_upcoming,
+            'upcoming_date': upcoming_date,
+            'monthly_cost': monthly_cost,
+            'vcpu_count': vcpu_count,
+            'support_year': support_year
+        }
+
+        if is_extended:
+            extended_support_instances.append(instance_info)
+        else:
+            upcoming_extended_instances.append(instance_info)
 
     # Calculate total monthly cost
     total_monthly_cost = sum(inst['monthly_cost'] for inst in extended_support_instances)
 
     # Print summary
-    print(f"\nTotal RDS Instances: {len(all_instances)}")
-    print(f"Extended Support Instances: {len(extended_support_instances)}")
-    print(f"Upcoming Extended Support Instances (within 30 days): {len(upcoming_extended_instances)}")
-    print(f"Estimated Monthly Extended Support Cost: ${total_monthly_cost:,.2f}")
+    print(f"\nTotal RDS Instances: {len(instances)}", file=out)
+    print(f"Extended Support Instances: {len(extended_support_instances)}", file=out)
+    print(f"Upcoming Extended Support Instances (within 30 days): {len(upcoming_extended_instances)}", file=out)
+    print(f"Estimated Monthly Extended Support Cost: ${total_monthly_cost:,.2f}", file=out)
 
     if extended_support_instances:
-        print(f"\n{'='*80}")
-        print(f"RDS INSTANCES IN EXTENDED SUPPORT - {environment_name.upper()}")
-        print(f"{'='*80}")
-        print(f"{'Instance ID':<50} {'Engine':<15} {'Version':<12} {'Class':<20}")
-        print(f"{'-'*50} {'-'*15} {'-'*12} {'-'*20}")
+        print(f"\n{'='*80}", file=out)
+        print(f"RDS INSTANCES IN EXTENDED SUPPORT - {environment_name.upper()}", file=out)
+        print(f"{'='*80}", file=out)
+        print(f"{'Instance ID':<50} {'Engine':<15} {'Version':<12} {'Class':<20}", file=out)
+        print(f"{'-'*50} {'-'*15} {'-'*12} {'-'*20}", file=out)
 
         for inst in extended_support_instances:
-            print(f"{inst['identifier']:<50} {inst['engine']:<15} {inst['version']:<12} {inst['class']:<20}")
+            print(f"{inst['identifier']:<50} {inst['engine']:<15} {inst['version']:<12} {inst['class']:<20}", file=out)
     else:
-        print(f"\n✓ No instances in extended support found in {environment_name.upper()}")
+        print(f"\n✓ No instances in extended support found in {environment_name.upper()}", file=out)
 
     if upcoming_extended_instances:
-        print(f"\n{'='*80}")
-        print(f"RDS INSTANCES ENTERING EXTENDED SUPPORT SOON - {environment_name.upper()}")
-        print(f"{'='*80}")
-        print(f"{'Instance ID':<50} {'Engine':<15} {'Version':<12} {'Class':<20}")
-        print(f"{'-'*50} {'-'*15} {'-'*12} {'-'*20}")
+        print(f"\n{'='*80}", file=out)
+        print(f"RDS INSTANCES ENTERING EXTENDED SUPPORT SOON - {environment_name.upper()}", file=out)
+        print(f"{'='*80}", file=out)
+        print(f"{'Instance ID':<50} {'Engine':<15} {'Version':<12} {'Class':<20}", file=out)
+        print(f"{'-'*50} {'-'*15} {'-'*12} {'-'*20}", file=out)
 
         for inst in upcoming_extended_instances:
-            print(f"{inst['identifier']:<50} {inst['engine']:<15} {inst['version']:<12} {inst['class']:<20}")
+            print(f"{inst['identifier']:<50} {inst['engine']:<15} {inst['version']:<12} {inst['class']:<20}", file=out)
 
-    return extended_support_instances, upcoming_extended_instances, all_instances
+    return extended_support_instances, upcoming_extended_instances, len(instances)
 
 def main():
     parser = argparse.ArgumentParser(description='Check RDS instances in Extended Support')
     parser.add_argument('--dev-profile', default='guild-dev', help='AWS profile for dev')
     parser.add_argument('--stage-profile', default='guild-stage', help='AWS profile for stage')
     parser.add_argument('--prod-profile', default='guild-prod', help='AWS profile for prod')
+    parser.add_argument('--max-workers', type=int, default=3, help='Environments scanned concurrently (default: 3)')
+    parser.add_argument('--regions', default=DEFAULT_REGION, help=f'Comma-separated regions to scan in each environment (default: {DEFAULT_REGION})')
+    parser.add_argument('--cache-dir', help="Cache each account's instance list here and reuse it for the rest of the day")
 
     args = parser.parse_args()
+    regions = parse_regions(args.regions)
+    if not regions:
+        parser.error('--regions must name at least one region')
+    if args.max_workers < 1:
+        parser.error('--max-workers must be at least 1')
 
     print("="*80)
     print("RDS Extended Support Check")
@@ -318,29 +299,13 @@ def main():
     all_extended = []
     all_upcoming = []
 
-    # Scan DEV
-    try:
-        dev_extended, dev_upcoming, dev_all = scan_rds_instances(args.dev_profile, 'dev')
-        all_extended.extend([('dev', inst) for inst in dev_extended])
-        all_upcoming.extend([('dev', inst) for inst in dev_upcoming])
-    except Exception as e:
-        print(f"\n✗ Error scanning DEV: {e}")
-
-    # Scan STAGE
-    try:
-        stage_extended, stage_upcoming, stage_all = scan_rds_instances(args.stage_profile, 'stage')
-        all_extended.extend([('stage', inst) for inst in stage_extended])
-        all_upcoming.extend([('stage', inst) for inst in stage_upcoming])
-    except Exception as e:
-        print(f"\n✗ Error scanning STAGE: {e}")
-
-    # Scan PROD
-    try:
-        prod_extended, prod_upcoming, prod_all = scan_rds_instances(args.prod_profile, 'prod')
-        all_extended.extend([('prod', inst) for inst in prod_extended])
-        all_upcoming.extend([('prod', inst) for inst in prod_upcoming])
-    except Exception as e:
-        print(f"\n✗ Error scanning PROD: {e}")
+    environments = [('dev', args.dev_profile), ('stage', args.stage_profile), ('prod', args.prod_profile)]
+    # Every environment is judged against the same date, which also lets them share the cached upcoming checks
+    today = date.today()
+
+    for env_name, (extended, upcoming, _) in scan_environments(environments, scan_rds_instances, args.max_workers, args.cache_dir, regions, today):
+        all_extended.extend([(env_name, inst) for inst in extended])
+        all_upcoming.extend([(env_name, inst) for inst in upcoming])
 
     # Calculate total costs across all environments
     total_monthly_cost_all = sum(inst['monthly_cost'] for env, inst in all_extended)
@@ -390,36 +355,34 @@ def main():
         writer.writerow(['Environment', 'Instance ID', 'Engine', 'Version', 'Instance Class', 'vCPUs', 'Instance Status', 'Support Status', 'Support End Date', 'Support Year', 'Monthly Cost (USD)'])
 
         # Write currently in extended support
-        for env, inst in all_extended:
-            writer.writerow([
-                env.upper(),
-                inst['identifier'],
-                inst['engine'],
-                inst['version'],
-                inst['class'],
-                inst['vcpu_count'],
-                inst['status'],
-                'In Extended Support',
-                inst['support_date'],
-                inst['support_year'],
-                f'${inst["monthly_cost"]:.2f}'
-            ])
+        writer.writerows([
+            env.upper(),
+            inst['identifier'],
+            inst['engine'],
+            inst['version'],
+            inst['class'],
+            inst['vcpu_count'],
+            inst['status'],
+            'In Extended Support',
+            inst['support_date'],
+            inst['support_year'],
+            f'${inst["monthly_cost"]:.2f}'
+        ] for env, inst in all_extended)
 
         # Write upcoming extended support instances
-        for env, inst in all_upcoming:
-            writer.writerow([
-                env.upper(),
-                inst['identifier'],
-                inst['engine'],
-                inst['version'],
-                inst['class'],
-                inst.get('vcpu_count', 0),
-                inst['status'],
-                'Entering Extended Support Soon',
-                inst['upcoming_date'],
-                'N/A',
-                '$0.00'
-            ])
+        writer.writerows([
+            env.upper(),
+            inst['identifier'],
+            inst['engine'],
+            inst['version'],
+            inst['class'],
+            inst.get('vcpu_count', 0),
+            inst['status'],
+            'Entering Extended Support Soon',
+            inst['upcoming_date'],
+            'N/A',
+            '$0.00'
+        ] for env, inst in all_upcoming)
 
     print(f"\n✓ CSV report saved: {csv_filename}")
 
@@ -3,108 +3,98 @@
 Script to identify RDS instances with engine versions less than 15
 """
 
-import boto3
 import argparse
 import csv
+import sys
 from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
 
+from rds_common import DEFAULT_REGION, fetch_all_instances, parse_regions, scan_environments
+
+# Report order: major version, then engine, then instance identifier
+INSTANCE_SORT_KEY = itemgetter('major_version', 'engine', 'identifier')
+
+def environment_instance_sort_key(environment_instance):
+    """Sort key for (environment, instance) pairs, ordering by the instance alone"""
+    return INSTANCE_SORT_KEY(environment_instance[1])
+
+@lru_cache(maxsize=None)
 def get_major_version(engine, version):
     """Extract the major version number from engine version string"""
+    # Every engine leads with its major version (PostgreSQL 12.22 -> 12, MySQL 5.7.44 -> 5,
+    # Oracle 19.0.0.0 -> 19, SQL Server 15.00.4043.16.v1 -> 15), so only the first part is parsed
     try:
-        version_parts = version.split('.')
-        engine_base = engine.split('-')[0]
-
-        if engine_base == 'postgres':
-            # PostgreSQL uses first number as major version (e.g., 12.22 -> 12)
-            return int(version_parts[0])
-        elif engine_base in ['mysql', 'mariadb']:
-            # MySQL/MariaDB uses first two numbers (e.g., 5.7.44 -> 5.7, but we take first for < 15 check)
-            return int(version_parts[0])
-        elif engine_base == 'oracle':
-            # Oracle uses first number (e.g., 19.0.0.0 -> 19)
-            return int(version_parts[0])
-        elif engine_base == 'sqlserver':
-            # SQL Server major version
-            return int(version_parts[0])
-        else:
-            # For other engines, try to parse first number
-            return int(version_parts[0])
-    except (ValueError, IndexError):
+        return int(version.split('.', 1)[0])
+    except ValueError:
         return None
 
-def scan_rds_instances(profile_name, environment_name):
-    """Scan RDS instances in an environment"""
-    session = boto3.Session(profile_name=profile_name)
-    rds_client = session.client('rds', region_name='us-west-2')
+def scan_rds_instances(profile_name, environment_name, out=sys.stdout, cache_dir=None, regions=(DEFAULT_REGION,)):
+    """Scan RDS instances in an environment, writing its report to out"""
+    print(f"\n{'='*80}", file=out)
+    print(f"Scanning {environment_name.upper()} environment (Profile: {profile_name})", file=out)
+    print(f"{'='*80}", file=out)
 
-    print(f"\n{'='*80}")
-    print(f"Scanning {environment_name.upper()} environment (Profile: {profile_name})")
-    print(f"{'='*80}")
-
-    # Get account ID
-    sts = session.client('sts')
-    account_id = sts.get_caller_identity()['Account']
-    print(f"Account ID: {account_id}")
+    account_id, instances = fetch_all_instances(profile_name, regions, cache_dir, out)
+    print(f"Account ID: {account_id}", file=out)
+    if len(regions) > 1:
+        print(f"Regions: {', '.join(regions)}", file=out)
 
     instances_below_v15 = []
-    all_instances = []
-
-    # Paginate through all RDS instances
-    paginator = rds_client.get_paginator('describe_db_instances')
 
-    for page in paginator.paginate():
-        for instance in page['DBInstances']:
-            db_id = instance['DBInstanceIdentifier']
-            engine = instance['Engine']
-            version = instance['EngineVersion']
-            instance_class = instance['DBInstanceClass']
-            status = instance['DBInstanceStatus']
+    for instance in instances:
+        engine = instance['Engine']
+        version = instance['EngineVersion']
 
-            major_version = get_major_version(engine, version)
+        major_version = get_major_version(engine, version)
 
-            instance_info = {
-                'identifier': db_id,
+        # Check if major version is less than 15
+        if major_version is not None and major_version < 15:
+            instances_below_v15.append({
+                'identifier': instance['DBInstanceIdentifier'],
                 'engine': engine,
                 'version': version,
                 'major_version': major_version,
-                'class': instance_class,
-                'status': status
-            }
-
-            all_instances.append(instance_info)
-
-            # Check if major version is less than 15
-            if major_version is not None and major_version < 15:
-                instances_below_v15.append(instance_info)
+                'class': instance['DBInstanceClass'],
+                'status': instance['DBInstanceStatus']
+            })
 
     # Print summary
-    print(f"\nTotal RDS Instances: {len(all_instances)}")
-    print(f"Instances with version < 15: {len(instances_below_v15)}")
+    print(f"\nTotal RDS Instances: {len(instances)}", file=out)
+    print(f"Instances with version < 15: {len(instances_below_v15)}", file=out)
 
     if instances_below_v15:
-        print(f"\n{'='*80}")
-        print(f"RDS INSTANCES WITH VERSION < 15 - {environment_name.upper()}")
-        print(f"{'='*80}")
-        print(f"{'Instance ID':<50} {'Engine':<15} {'Version':<15} {'Major':<8} {'Class':<20}")
-        print(f"{'-'*50} {'-'*15} {'-'*15} {'-'*8} {'-'*20}")
+        print(f"\n{'='*80}", file=out)
+        print(f"RDS INSTANCES WITH VERSION < 15 - {environment_name.upper()}", file=out)
+        print(f"{'='*80}", file=out)
+        print(f"{'Instance ID':<50} {'Engine':<15} {'Version':<15} {'Major':<8} {'Class':<20}", file=out)
+        print(f"{'-'*50} {'-'*15} {'-'*15} {'-'*8} {'-'*20}", file=out)
 
         # Sort by major version, then by engine
-        instances_below_v15.sort(key=lambda x: (x['major_version'], x['engine'], x['identifier']))
+        instances_below_v15.sort(key=INSTANCE_SORT_KEY)
 
         for inst in instances_below_v15:
-            print(f"{inst['identifier']:<50} {inst['engine']:<15} {inst['version']:<15} {inst['major_version']:<8} {inst['class']:<20}")
+            print(f"{inst['identifier']:<50} {inst['engine']:<15} {inst['version']:<15} {inst['major_version']:<8} {inst['class']:<20}", file=out)
     else:
-        print(f"\n✓ No instances with version < 15 found in {environment_name.upper()}")
+        print(f"\n✓ No instances with version < 15 found in {environment_name.upper()}", file=out)
 
-    return instances_below_v15, all_instances
+    return instances_below_v15, len(instances)
 
 def main():
     parser = argparse.ArgumentParser(description='Check RDS instances with version < 15')
     parser.add_argument('--dev-profile', default='guild-dev', help='AWS profile for dev')
     parser.add_argument('--stage-profile', default='guild-stage', help='AWS profile for stage')
     parser.add_argument('--prod-profile', default='guild-prod', help='AWS profile for prod')
+    parser.add_argument('--max-workers', type=int, default=3, help='Environments scanned concurrently (default: 3)')
+    parser.add_argument('--regions', default=DEFAULT_REGION, help=f'Comma-separated regions to scan in each environment (default: {DEFAULT_REGION})')
+    parser.add_argument('--cache-dir', help="Cache each account's instance list here and reuse it for the rest of the day")
 
     args = parser.parse_args()
+    regions = parse_regions(args.regions)
+    if not regions:
+        parser.error('--regions must name at least one region')
+    if args.max_workers < 1:
+        parser.error('--max-workers must be at least 1')
 
     print("="*80)
     print("RDS Version Scanner - Instances with Version < 15")
@@ -113,26 +103,10 @@ def main():
 
     all_instances_v15 = []
 
-    # Scan DEV
-    try:
-        dev_instances, dev_all = scan_rds_instances(args.dev_profile, 'dev')
-        all_instances_v15.extend([('dev', inst) for inst in dev_instances])
-    except Exception as e:
-        print(f"\n✗ Error scanning DEV: {e}")
+    environments = [('dev', args.dev_profile), ('stage', args.stage_profile), ('prod', args.prod_profile)]
 
-    # Scan STAGE
-    try:
-        stage_instances, stage_all = scan_rds_instances(args.stage_profile, 'stage')
-        all_instances_v15.extend([('stage', inst) for inst in stage_instances])
-    except Exception as e:
-        print(f"\n✗ Error scanning STAGE: {e}")
-
-    # Scan PROD
-    try:
-        prod_instances, prod_all = scan_rds_instances(args.prod_profile, 'prod')
-        all_instances_v15.extend([('prod', inst) for inst in prod_instances])
-    except Exception as e:
-        print(f"\n✗ Error scanning PROD: {e}")
+    for env_name, (instances, _) in scan_environments(environments, scan_rds_instances, args.max_workers, args.cache_dir, regions):
+        all_instances_v15.extend([(env_name, inst) for inst in instances])
 
     # Final summary
     print(f"\n{'='*80}")
@@ -145,7 +119,7 @@ def main():
         print(f"{'-'*12} {'-'*50} {'-'*15} {'-'*15} {'-'*8}")
 
         # Sort by major version
-        all_instances_v15.sort(key=lambda x: (x[1]['major_version'], x[1]['engine'], x[1]['identifier']))
+        all_instances_v15.sort(key=environment_instance_sort_key)
 
         for env, inst in all_instances_v15:
             print(f"{env.upper():<12} {inst['identifier']:<50} {inst['engine']:<15} {inst['version']:<15} {inst['major_version']:<8}")
@@ -167,16 +141,15 @@ def main():
         writer.writerow(['Environment', 'Instance ID', 'Engine', 'Version', 'Major Version', 'Instance Class', 'Status'])
 
         # Write data rows
-        for env, inst in all_instances_v15:
-            writer.writerow([
-                env.upper(),
-                inst['identifier'],
-                inst['engine'],
-                inst['version'],
-                inst['major_version'],
-                inst['class'],
-                inst['status']
-            ])
+        writer.writerows([
+            env.upper(),
+            inst['identifier'],
+            inst['engine'],
+            inst['version'],
+            inst['major_version'],
+            inst['class'],
+            inst['status']
+        ] for env, inst in all_instances_v15)
 
     print(f"\n✓ CSV report saved: {csv_filename}")
 
@@ -32,7 +32,7 @@ fi
 
 # Check if required packages are installed
 echo -e "${YELLOW}Checking dependencies...${NC}"
-python3 -c "import boto3, requests" 2>/dev/null || {
+python3 -c "import boto3, requests, orjson" 2>/dev/null || {
     echo -e "${RED}Missing required packages. Installing...${NC}"
     pip3 install -r requirements-monitor.txt
 }
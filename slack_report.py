@@ -0,0 +1,206 @@
+"""
+Slack message formatting for AWS Resource Monitor reports
+Shared by aws_resource_monitor.py and consolidate_and_notify.py
+"""
+
+import os
+import requests
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Reused across posts so retries (e.g. when Slack rate limits with 429) keep the
+# same connection instead of repeating the TCP/TLS handshake. Only rate limits and
+# connection errors are retried: after a 5xx or read error Slack may already have
+# posted the message, and a retry would post it twice
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(max_retries=Retry(
+    total=5,
+    read=0,
+    backoff_factor=0.5,
+    status_forcelist=[429],
+    allowed_methods=frozenset(['POST']),
+    raise_on_status=False
+)))
+
+# Traffic-light thresholds as (lower bound, emoji), checked from the top down
+LAMBDA_STORAGE_STATUS = ((70, "🔴"), (50, "🟡"), (float('-inf'), "🟢"))
+IAM_ROLES_STATUS = ((80, "🔴"), (60, "🟡"), (float('-inf'), "🟢"))
+
+
+def status(pct, thresholds):
+    """Return the emoji for the first threshold the percentage exceeds."""
+    return next(emoji for threshold, emoji in thresholds if pct > threshold)
+
+
+def build_slack_blocks(all_results, footer_text):
+    """Build Slack blocks for the weekly AWS resources usage report."""
+    environment_blocks = [block for env, results in all_results.items() for block in _iter_environment_blocks(env, results)]
+    return assemble_slack_blocks(environment_blocks, footer_text)
+
+
+def build_environment_blocks(env, results):
+    """Build the Slack blocks summarizing one environment.
+
+    Lets callers that already walk each environment (e.g. to write the CSV)
+    build its blocks in the same pass and assemble the report afterwards.
+    """
+    return list(_iter_environment_blocks(env, results))
+
+
+def assemble_slack_blocks(environment_blocks, footer_text):
+    """Wrap prebuilt environment blocks with the report header, recommendations and footer."""
+    return list(_iter_slack_blocks(environment_blocks, footer_text))
+
+
+def send_slack_blocks(webhook_url, blocks):
+    """Post Slack blocks to a webhook and return the response."""
+    payload = {
+        "blocks": blocks
+    }
+
+    return _SESSION.post(webhook_url, json=payload, timeout=10)
+
+
+def _iter_slack_blocks(environment_blocks, footer_text):
+    """Yield the report blocks: header, the environment sections, then footer."""
+    yield {
+        "type": "header",
+        "text": {
+            "type": "plain_text",
+            "text": "📊 Weekly AWS Resources Usage Alert",
+            "emoji": True
+        }
+    }
+    yield {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": f"*Report Date:* {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        }
+    }
+    yield {
+        "type": "divider"
+    }
+    yield {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "*📋 Definitions & Limits:*\n"
+                    "• *IAM Roles Limit:* Default AWS quota is 1,000 roles per account\n"
+                    "• *Lambda Storage Limit:* 75 GB default (can be increased to 300 GB)\n"
+                    "• *Bloated Lambdas:* Functions with >10 versions consuming extra storage\n"
+                    "• *Underused RDS:* Instances with <10% average CPU over 7 days\n"
+                    "• *Old CloudWatch Logs:* Log groups with no activity for >12 months"
+        }
+    }
+    yield {
+        "type": "divider"
+    }
+
+    yield from environment_blocks
+
+    # Add recommendations section
+    yield {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "*💡 Recommendations:*\n"
+                    "• *Delete unused IAM roles* to stay within quota limits and improve security posture\n"
+                    "• *Clean up old Lambda versions* - keep only 2-3 recent versions to reduce storage bloat\n"
+                    "• *Delete unused CloudWatch log groups* (>12 months old) to reduce storage costs\n"
+                    "• *Review underused RDS instances* - consider downsizing or consolidating\n"
+                    "  └ <https://app.datadoghq.com/dashboard/9ij-isf-e39/overprovisioned-rds?fromUser=false&offset=0&refresh_mode=yearly&from_ts=1767254400000&to_ts=1767628625022&live=true|View Overprovisioned RDS Dashboard>"
+        }
+    }
+    yield {
+        "type": "divider"
+    }
+    yield {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "*💰 Understanding AWS Costs:*\n"
+                    "• To understand the cost on AWS resources, please use AWS Cost Explorer\n"
+                    "  └ <https://guild-education.atlassian.net/wiki/spaces/DEVOPS/pages/4582638174/AWS+Cost+Explorer+How+to+Analyze+Cloud+Costs|AWS Cost Explorer Guide>\n"
+                    "• To understand the cost on RDS particularly, refer to this Datadog dashboard\n"
+                    "  └ <https://app.datadoghq.com/cost/analyze/explorer?query=sum%3Aaws.cost.net.amortized.shared.resources.allocated%7Bservicename%3Ards%20AND%20aws_usage_type%3AUSW2-ExtendedSupport%3A%2A%20AND%20aws_cost_type%20IN%20%28Usage%2CDiscountedUsage%2CSavingsPlanCoveredUsage%29%20AND%20NOT%20aws_product%3Asupportenterprise%7D%20by%20%7Bteam%7D.rollup%28sum%2C%20weekly%29&anomaliesOnly=false&displayType=bars&filterRecent=false&measureType=absolute&tableViewType=breakdown&timeframeRefreshMode=paused&start=1756684800000&end=1765497599000&paused=true|RDS Cost Analysis by Team>"
+        }
+    }
+    yield {
+        "type": "divider"
+    }
+
+    # Add footer
+    github_run_url = os.environ.get('GITHUB_RUN_URL')
+    if github_run_url:
+        footer_text += f" | <{github_run_url}|View in GitHub Actions>"
+
+    yield {
+        "type": "context",
+        "elements": [
+            {
+                "type": "mrkdwn",
+                "text": footer_text
+            }
+        ]
+    }
+
+
+def _iter_environment_blocks(env, results):
+    """Yield the blocks summarizing one environment."""
+    env_upper = env.upper()
+
+    # Lambda section
+    lambda_emoji = status(results['lambda']['storage_percent'], LAMBDA_STORAGE_STATUS)
+    iam_emoji = status(results['iam']['roles_percent'], IAM_ROLES_STATUS)
+
+    # Calculate percentages
+    rds_underused_percent = round((results['rds']['underused_count'] / results['rds']['total_instances'] * 100), 1) if results['rds']['total_instances'] > 0 else 0
+    logs_old_percent = round((results['logs']['old_log_groups_count'] / results['logs']['total_log_groups'] * 100), 1) if results['logs']['total_log_groups'] > 0 else 0
+    lambda_unused_percent = round((results['lambda']['unused_count'] / results['lambda']['total_functions'] * 100), 1) if results['lambda']['total_functions'] > 0 else 0
+    lambda_bloat_percent = round((results['lambda']['version_bloat_count'] / results['lambda']['total_functions'] * 100), 1) if results['lambda']['total_functions'] > 0 else 0
+
+    yield {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": f"*{env_upper} Environment*"
+        }
+    }
+    yield {
+        "type": "section",
+        "fields": [
+            {
+                "type": "mrkdwn",
+                "text": f"{iam_emoji} *IAM Roles in {env_upper}*\n{results['iam']['roles_percent']}% of 100% ({results['iam']['total_roles']}/{results['iam']['roles_quota']})"
+            },
+            {
+                "type": "mrkdwn",
+                "text": f"{lambda_emoji} *Lambda Storage in {env_upper}*\n{results['lambda']['storage_percent']}% of 100% ({results['lambda']['total_storage_gb']}/{results['lambda']['storage_limit_gb']} GB)"
+            }
+        ]
+    }
+    yield {
+        "type": "section",
+        "fields": [
+            {
+                "type": "mrkdwn",
+                "text": f"*Bloated Lambdas:* {lambda_bloat_percent}% ({results['lambda']['version_bloat_count']}/{results['lambda']['total_functions']})\n*Unused Lambdas:* {lambda_unused_percent}% ({results['lambda']['unused_count']}/{results['lambda']['total_functions']})"
+            },
+            {
+                "type": "mrkdwn",
+                "text": f"*Underused RDS:* {rds_underused_percent}% ({results['rds']['underused_count']}/{results['rds']['total_instances']})"
+            }
+        ]
+    }
+    yield {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": f"*Old CloudWatch Logs:* {logs_old_percent}% ({results['logs']['old_log_groups_count']}/{results['logs']['total_log_groups']} log groups >12 months) | Total Storage: {results['logs']['total_storage_gb']} GB"
+        }
+    }
+    yield {
+        "type": "divider"
+    }